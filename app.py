@@ -1,14 +1,37 @@
 from flask import Flask, render_template, send_from_directory, jsonify, request, session, redirect, url_for
 import os
-from PIL import Image
+from PIL import Image, ImageOps
 import io
 import base64
 from urllib.parse import unquote, quote
 from functools import wraps
-import cv2
-import numpy as np
 import hashlib
 import shutil
+import gzip
+import threading
+import atexit
+import heapq
+import itertools
+import tempfile
+import time
+import sqlite3
+import json
+from datetime import datetime
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# fcntl is used to share the generation budget between gunicorn workers; it is
+# unavailable on Windows, where the budget then applies per process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Brotli is optional - gzip is always available as a fallback
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 
@@ -19,6 +42,83 @@ CACHE_FOLDER = os.path.join(IMAGES_FOLDER, '.thumbscache')
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp'}
 VIDEO_EXTENSIONS = {'mp4', 'webm', 'ogg', 'avi', 'mov', 'mkv', 'm4v', 'mpg', 'mpeg'}
 
+# Compression of JSON API responses
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', '6'))
+# Maximum total bytes of compressed payloads kept in memory per worker
+COMPRESSION_CACHE_SIZE = int(os.environ.get('COMPRESSION_CACHE_SIZE', str(16 * 1024 * 1024)))
+
+# Background thumbnail generation
+THUMBNAIL_THREADS = int(os.environ.get('THUMBNAIL_THREADS', '2'))
+# Finished thumbnails kept per worker until a client polls for them
+THUMBNAIL_RESULTS_KEPT = int(os.environ.get('THUMBNAIL_RESULTS_KEPT', '512'))
+# Maximum number of paths accepted by a single poll request
+THUMBNAIL_POLL_LIMIT = 500
+# Seconds after which another worker's job marker counts as abandoned
+THUMBNAIL_JOB_MARKER_TTL = 300
+# Seconds between checks for jobs other workers want sooner
+THUMBNAIL_BUMP_INTERVAL = 1
+# Seconds a failed thumbnail or preview strip isn't retried (unless the file changes)
+THUMBNAIL_FAILURE_TTL = int(os.environ.get('THUMBNAIL_FAILURE_TTL', '3600'))
+
+# Local (non-NAS) folder for lock files shared between workers
+RUNTIME_FOLDER = os.environ.get('RUNTIME_FOLDER', os.path.join(tempfile.gettempdir(), 'docker-snap'))
+# Share of CPU cores thumbnail/preview generation may use; the rest is kept
+# free for serving pages, full-size images and videos
+GENERATION_CPU_SHARE = float(os.environ.get('GENERATION_CPU_SHARE', '0.5'))
+# Explicit cap on concurrent generation jobs across all workers (overrides the share)
+GENERATION_MAX_JOBS = int(os.environ.get('GENERATION_MAX_JOBS', '0')) or \
+    max(1, int((os.cpu_count() or 1) * GENERATION_CPU_SHARE))
+# Seconds between attempts of background jobs waiting for a free slot
+ADMISSION_RETRY_INTERVAL = 0.2
+
+# Header metadata (dimensions, orientation, capture date) cached per file
+METADATA_FOLDER = os.path.join(CACHE_FOLDER, 'meta')
+# Metadata entries each worker keeps in memory
+METADATA_MEMORY_ENTRIES = 10000
+# Sort orders accepted by the thumbnails API for images and videos
+LISTING_SORTS = ('name', 'taken', '-taken')
+
+# Hover preview strips for videos (evenly spaced frames in one sprite image)
+PREVIEW_STRIP_FOLDER = os.path.join(CACHE_FOLDER, 'strips')
+PREVIEW_STRIP_FRAMES = int(os.environ.get('PREVIEW_STRIP_FRAMES', '10'))
+PREVIEW_STRIP_HEIGHT = int(os.environ.get('PREVIEW_STRIP_HEIGHT', '180'))
+# Clips longer than this (seconds) seek to each frame instead of decoding everything
+PREVIEW_STRIP_SEEK_AFTER = float(os.environ.get('PREVIEW_STRIP_SEEK_AFTER', '60'))
+
+# Index of the whole library used by search (SQLite on local storage)
+LIBRARY_INDEX_PATH = os.environ.get('LIBRARY_INDEX_PATH', os.path.join(RUNTIME_FOLDER, 'library.db'))
+# Seconds between incremental rescans of the library
+LIBRARY_SCAN_INTERVAL = int(os.environ.get('LIBRARY_SCAN_INTERVAL', '300'))
+SEARCH_PAGE_SIZE = 100
+SEARCH_MAX_PAGE_SIZE = 500
+# Sort keys accepted by the search API (prefix with '-' for descending)
+SEARCH_SORT_COLUMNS = {'name': 'name_lower', 'path': 'path', 'size': 'size', 'modified': 'mtime'}
+
+# Perceptual-hash duplicate detection (images are hashed in the background)
+DUPLICATE_DETECTION = os.environ.get('DUPLICATE_DETECTION', 'true').lower() in ('1', 'true', 'yes')
+# Default and highest accepted Hamming distance between 64-bit hashes of duplicates
+DUPLICATE_MAX_DISTANCE = int(os.environ.get('DUPLICATE_MAX_DISTANCE', '4'))
+DUPLICATE_DISTANCE_LIMIT = 5
+# Images hashed per batch (each batch holds the hashing lock across workers)
+DUPLICATE_HASH_BATCH = 200
+DUPLICATE_PAGE_SIZE = 50
+DUPLICATE_MAX_PAGE_SIZE = 200
+
+# Seconds a readiness check may take before it counts as failed (e.g. a stalled NAS mount)
+READINESS_TIMEOUT = float(os.environ.get('READINESS_TIMEOUT', '3'))
+
+# Maximum number of paths accepted by a single batch delete
+BATCH_DELETE_LIMIT = 1000
+
+# Resize/encode backend for thumbnails (see THUMBNAIL_BACKENDS)
+THUMBNAIL_BACKEND = os.environ.get('THUMBNAIL_BACKEND', 'pil-lanczos')
+THUMBNAIL_JPEG_QUALITY = 85
+
+# Thumbnail job priorities (lower runs first)
+PRIORITY_VISIBLE = 0
+PRIORITY_PREFETCH = 1
+
 # Get authentication credentials from environment variables
 USERNAME = os.environ.get('GALLERY_USERNAME', 'user')
 PASSWORD = os.environ.get('GALLERY_PASSWORD', 'password')
@@ -144,6 +244,128 @@ def get_breadcrumb_path(current_path):
 
     return breadcrumbs
 
+# OpenCV (and the NumPy it pulls in) is only needed for videos, so it is
+# imported on first use instead of in every preloaded gunicorn worker
+_cv2 = None
+_cv2_lock = threading.Lock()
+
+def get_cv2():
+    """Import OpenCV on first use and return the module"""
+    global _cv2
+    if _cv2 is None:
+        with _cv2_lock:
+            if _cv2 is None:
+                import cv2
+                # One core per job, so the admission controller's budget holds
+                cv2.setNumThreads(1)
+                _cv2 = cv2
+    return _cv2
+
+class PilThumbnailBackend:
+    """
+    Downscales with PIL's thumbnail() and encodes with PIL
+
+    reducing_gap controls how much of the downscale is done cheaply first
+    (JPEG draft decoding and reduce()) before the resampling filter runs;
+    smaller values are faster and slightly softer.
+    """
+
+    def __init__(self, resample, reducing_gap):
+        self.resample = resample
+        self.reducing_gap = reducing_gap
+
+    def resize_image(self, img, size):
+        """Return JPEG bytes of an opened PIL image scaled to fit size x size"""
+        # Convert to RGB if necessary (for PNG with transparency)
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGB')
+
+        # Calculate thumbnail size maintaining aspect ratio
+        img.thumbnail((size, size), self.resample, reducing_gap=self.reducing_gap)
+
+        # Apply EXIF orientation so portrait photos aren't shown sideways
+        # (after downscaling, so JPEG draft decoding still applies)
+        img = ImageOps.exif_transpose(img)
+        return self._encode(img)
+
+    def resize_frame(self, frame, size):
+        """Return JPEG bytes of a BGR video frame scaled to fit size x size"""
+        # Convert BGR to RGB (OpenCV uses BGR by default)
+        pil_image = Image.fromarray(frame[:, :, ::-1])
+        pil_image.thumbnail((size, size), self.resample, reducing_gap=self.reducing_gap)
+        return self._encode(pil_image)
+
+    def _encode(self, img):
+        img_io = io.BytesIO()
+        img.save(img_io, 'JPEG', quality=THUMBNAIL_JPEG_QUALITY)
+        return img_io.getvalue()
+
+class Cv2AreaThumbnailBackend:
+    """
+    Downscales with OpenCV's INTER_AREA filter and encodes with cv2.imencode
+
+    Images are still decoded by PIL, using JPEG draft mode to skip most of
+    the pixels, then handed to OpenCV as arrays. Video frames never leave
+    OpenCV.
+    """
+
+    # PIL EXIF orientation -> numpy operation on an (height, width, channels) array
+    ORIENTATION_TRANSFORMS = {
+        2: lambda a: a[:, ::-1],
+        3: lambda a: a[::-1, ::-1],
+        4: lambda a: a[::-1],
+        5: lambda a: a.transpose(1, 0, 2),
+        6: lambda a: a.transpose(1, 0, 2)[:, ::-1],
+        7: lambda a: a.transpose(1, 0, 2)[::-1, ::-1],
+        8: lambda a: a.transpose(1, 0, 2)[::-1],
+    }
+
+    def resize_image(self, img, size):
+        """Return JPEG bytes of an opened PIL image scaled to fit size x size"""
+        cv2 = get_cv2()
+        import numpy as np
+
+        orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+        img.draft('RGB', (size, size))
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        frame = cv2.cvtColor(np.asarray(img), cv2.COLOR_RGB2BGR)
+
+        transform = self.ORIENTATION_TRANSFORMS.get(orientation)
+        if transform:
+            frame = np.ascontiguousarray(transform(frame))
+        return self.resize_frame(frame, size)
+
+    def resize_frame(self, frame, size):
+        """Return JPEG bytes of a BGR video frame scaled to fit size x size"""
+        cv2 = get_cv2()
+        height, width = frame.shape[:2]
+        scale = min(size / width, size / height)
+        if scale < 1:
+            target = (max(1, round(width * scale)), max(1, round(height * scale)))
+            frame = cv2.resize(frame, target, interpolation=cv2.INTER_AREA)
+
+        ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_JPEG_QUALITY])
+        if not ok:
+            raise ValueError('JPEG encoding failed')
+        return encoded.tobytes()
+
+# Selectable with the THUMBNAIL_BACKEND environment variable. Cached
+# thumbnails are kept when switching; clear .thumbscache to regenerate them.
+THUMBNAIL_BACKENDS = {
+    'pil-lanczos': PilThumbnailBackend(Image.Resampling.LANCZOS, 2.0),
+    'pil-reduce': PilThumbnailBackend(Image.Resampling.BICUBIC, 1.0),
+    'cv2-area': Cv2AreaThumbnailBackend(),
+}
+
+if THUMBNAIL_BACKEND not in THUMBNAIL_BACKENDS:
+    print(f"Warning: Unknown THUMBNAIL_BACKEND '{THUMBNAIL_BACKEND}', using pil-lanczos")
+    THUMBNAIL_BACKEND = 'pil-lanczos'
+
+def get_thumbnail_backend(name=None):
+    """Return the configured thumbnail backend, or the one called name"""
+    return THUMBNAIL_BACKENDS[name or THUMBNAIL_BACKEND]
+
 def get_cache_filename(filepath, filesize, thumb_size):
     """Generate cache filename based on filepath, filesize, and thumbnail size"""
     # Create hash of the relative filepath for a unique but consistent identifier
@@ -152,6 +374,29 @@ def get_cache_filename(filepath, filesize, thumb_size):
     cache_name = f"{path_hash}_s{filesize}_t{thumb_size}.jpg"
     return cache_name
 
+# Per-worker counters reported by /health/stats
+WORKER_STARTED = time.time()
+worker_counters = {'thumbnail_cache_hits': 0, 'thumbnail_cache_misses': 0, 'thumbnails_generated': 0}
+_worker_counters_lock = threading.Lock()
+
+def reset_worker_stats():
+    """Start the uptime and counters afresh in a forked worker"""
+    global WORKER_STARTED, _worker_counters_lock
+    WORKER_STARTED = time.time()
+    # The parent's lock may have been held by another thread at fork time
+    _worker_counters_lock = threading.Lock()
+    for name in worker_counters:
+        worker_counters[name] = 0
+
+# With preload_app the module is imported once in the gunicorn master
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_worker_stats)
+
+def count_event(name, amount=1):
+    """Add to one of the worker_counters"""
+    with _worker_counters_lock:
+        worker_counters[name] += amount
+
 def get_cached_thumbnail(filepath, filesize, thumb_size):
     """Retrieve cached thumbnail if it exists and is valid"""
     try:
@@ -164,10 +409,12 @@ def get_cached_thumbnail(filepath, filesize, thumb_size):
             with open(cache_path, 'rb') as f:
                 img_data = f.read()
                 img_base64 = base64.b64encode(img_data).decode('utf-8')
+                count_event('thumbnail_cache_hits')
                 return f"data:image/jpeg;base64,{img_base64}"
     except Exception as e:
         print(f"Error reading cached thumbnail for {filepath}: {e}")
 
+    count_event('thumbnail_cache_misses')
     return None
 
 def save_thumbnail_to_cache(filepath, filesize, thumb_size, img_bytes):
@@ -181,6 +428,7 @@ def save_thumbnail_to_cache(filepath, filesize, thumb_size, img_bytes):
 
         with open(cache_path, 'wb') as f:
             f.write(img_bytes)
+        count_event('thumbnails_generated')
     except Exception as e:
         print(f"Error saving thumbnail to cache for {filepath}: {e}")
 
@@ -192,13 +440,168 @@ def cleanup_old_cache(current_size):
 
         for item in os.listdir(CACHE_FOLDER):
             item_path = os.path.join(CACHE_FOLDER, item)
-            # Remove directories that are not the current size
-            if os.path.isdir(item_path) and item != str(current_size):
+            # Remove thumbnail directories that are not the current size
+            if os.path.isdir(item_path) and item.isdigit() and item != str(current_size):
                 print(f"Cleaning up old cache directory: {item}")
                 shutil.rmtree(item_path)
     except Exception as e:
         print(f"Error cleaning up old cache: {e}")
 
+# EXIF tags read from image headers
+EXIF_ORIENTATION = 0x0112
+EXIF_DATETIME = 0x0132
+EXIF_IFD = 0x8769
+EXIF_DATETIME_ORIGINAL = 0x9003
+
+# Metadata keyed by (relative path, filesize), oldest first
+_metadata_cache = OrderedDict()
+_metadata_cache_lock = threading.Lock()
+
+def get_metadata_filename(filepath, filesize):
+    """Generate metadata cache filename, keyed like the thumbnail cache"""
+    path_hash = hashlib.md5(filepath.encode('utf-8')).hexdigest()[:16]
+    return f"{path_hash}_s{filesize}.json"
+
+def parse_exif_datetime(value):
+    """Convert an EXIF 'YYYY:MM:DD HH:MM:SS' value to ISO 8601, or None"""
+    try:
+        return datetime.strptime(str(value).strip('\x00 '), '%Y:%m:%d %H:%M:%S').isoformat()
+    except ValueError:
+        return None
+
+def extract_image_metadata(image_path):
+    """Read dimensions, orientation and capture date from the image header only"""
+    # Image.open only parses the header; pixel data is never decoded here
+    with Image.open(image_path) as img:
+        width, height = img.size
+        exif = img.getexif()
+        orientation = exif.get(EXIF_ORIENTATION, 1)
+        taken = exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+
+    # Orientations 5-8 are rotated by 90 degrees, so report display dimensions
+    if orientation in (5, 6, 7, 8):
+        width, height = height, width
+
+    return {
+        'width': width,
+        'height': height,
+        'orientation': orientation,
+        'taken': parse_exif_datetime(taken) if taken else None
+    }
+
+def extract_video_metadata(video_path):
+    """Read resolution, frame rate and duration from the video container"""
+    cv2 = get_cv2()
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            return {}
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        return {
+            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'fps': round(fps, 3) if fps else None,
+            'duration': round(frame_count / fps, 3) if fps and frame_count > 0 else None
+        }
+    finally:
+        cap.release()
+
+def get_media_metadata(media_type, media_path, relative_path, cached_only=False):
+    """
+    Get header metadata of an image or video, extracting it once per file
+
+    Results are cached in memory and in METADATA_FOLDER, keyed by relative
+    path and filesize like thumbnails. Returns {} if nothing could be read,
+    or None with cached_only when it hasn't been extracted yet.
+    """
+    try:
+        filesize = os.path.getsize(media_path)
+    except OSError:
+        return {}
+
+    cache_key = (relative_path, filesize)
+    with _metadata_cache_lock:
+        if cache_key in _metadata_cache:
+            _metadata_cache.move_to_end(cache_key)
+            return _metadata_cache[cache_key]
+
+    cache_path = os.path.join(METADATA_FOLDER, get_metadata_filename(relative_path, filesize))
+    metadata = None
+    try:
+        with open(cache_path, 'r') as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    if metadata is None:
+        if cached_only:
+            return None
+        try:
+            if media_type == 'image':
+                metadata = extract_image_metadata(media_path)
+            else:
+                metadata = extract_video_metadata(media_path)
+        except Exception as e:
+            print(f"Error reading metadata for {media_path}: {e}")
+            metadata = {}
+
+        try:
+            os.makedirs(METADATA_FOLDER, exist_ok=True)
+            with open(cache_path, 'w') as f:
+                json.dump(metadata, f)
+        except OSError as e:
+            print(f"Error saving metadata to cache for {relative_path}: {e}")
+
+    with _metadata_cache_lock:
+        _metadata_cache[cache_key] = metadata
+        while len(_metadata_cache) > METADATA_MEMORY_ENTRIES:
+            _metadata_cache.popitem(last=False)
+
+    return metadata
+
+# Compressed payloads keyed by (payload hash, encoding), oldest first
+_compression_cache = OrderedDict()
+_compression_cache_bytes = 0
+_compression_cache_lock = threading.Lock()
+
+def compress_payload(data, encoding):
+    """Compress data with the given encoding ('br' or 'gzip')"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=max(0, min(11, COMPRESSION_LEVEL)))
+    # mtime=0 keeps the output deterministic for identical payloads
+    return gzip.compress(data, compresslevel=max(1, min(9, COMPRESSION_LEVEL)), mtime=0)
+
+def get_compressed_payload(data, encoding):
+    """
+    Return compressed data, reusing a previous result for an identical payload
+
+    Listings of unchanged folders produce byte-identical JSON, so hashing the
+    payload is enough to skip recompressing it on every refresh.
+    """
+    global _compression_cache_bytes
+
+    cache_key = (hashlib.md5(data).hexdigest(), encoding)
+    with _compression_cache_lock:
+        cached = _compression_cache.get(cache_key)
+        if cached is not None:
+            _compression_cache.move_to_end(cache_key)
+            return cached
+
+    compressed = compress_payload(data, encoding)
+
+    if len(compressed) <= COMPRESSION_CACHE_SIZE:
+        with _compression_cache_lock:
+            if cache_key not in _compression_cache:
+                _compression_cache[cache_key] = compressed
+                _compression_cache_bytes += len(compressed)
+            # Evict least recently used payloads until we are within budget
+            while _compression_cache_bytes > COMPRESSION_CACHE_SIZE and _compression_cache:
+                _, evicted = _compression_cache.popitem(last=False)
+                _compression_cache_bytes -= len(evicted)
+
+    return compressed
+
 def create_thumbnail(image_path, size, relative_path=''):
     """Create thumbnail of specified size with caching support"""
     try:
@@ -213,20 +616,9 @@ def create_thumbnail(image_path, size, relative_path=''):
 
         # Generate thumbnail if not cached
         with Image.open(image_path) as img:
-            # Convert to RGB if necessary (for PNG with transparency)
-            if img.mode in ('RGBA', 'LA', 'P'):
-                img = img.convert('RGB')
-
-            # Calculate thumbnail size maintaining aspect ratio
-            img.thumbnail((size, size), Image.Resampling.LANCZOS)
-
-            # Save to bytes
-            img_io = io.BytesIO()
-            img.save(img_io, 'JPEG', quality=85)
-            img_io.seek(0)
+            img_bytes = get_thumbnail_backend().resize_image(img, size)
 
             # Save to cache
-            img_bytes = img_io.getvalue()
             save_thumbnail_to_cache(cache_key, filesize, size, img_bytes)
 
             # Encode to base64
@@ -249,6 +641,8 @@ def create_video_thumbnail(video_path, size, relative_path=''):
             return cached
 
         # Generate video thumbnail if not cached
+        cv2 = get_cv2()
+
         # Open video file
         cap = cv2.VideoCapture(video_path)
 
@@ -275,22 +669,10 @@ def create_video_thumbnail(video_path, size, relative_path=''):
             print(f"Error: Could not read frame from {video_path}")
             return None
 
-        # Convert BGR to RGB (OpenCV uses BGR by default)
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-        # Convert numpy array to PIL Image
-        pil_image = Image.fromarray(frame_rgb)
-
         # Create thumbnail maintaining aspect ratio
-        pil_image.thumbnail((size, size), Image.Resampling.LANCZOS)
-
-        # Save to bytes
-        img_io = io.BytesIO()
-        pil_image.save(img_io, 'JPEG', quality=85)
-        img_io.seek(0)
+        img_bytes = get_thumbnail_backend().resize_frame(frame, size)
 
         # Save to cache
-        img_bytes = img_io.getvalue()
         save_thumbnail_to_cache(cache_key, filesize, size, img_bytes)
 
         # Encode to base64
@@ -301,6 +683,137 @@ def create_video_thumbnail(video_path, size, relative_path=''):
         print(f"Error creating video thumbnail for {video_path}: {e}")
         return None
 
+def get_preview_strip_filename(filepath, filesize):
+    """Generate preview strip cache filename (without extension), keyed like the thumbnail cache"""
+    path_hash = hashlib.md5(filepath.encode('utf-8')).hexdigest()[:16]
+    return f"{path_hash}_s{filesize}_f{PREVIEW_STRIP_FRAMES}_h{PREVIEW_STRIP_HEIGHT}"
+
+def get_cached_preview_strip(filepath, filesize):
+    """Return the cached preview strip manifest with its sprite as a data URI, or None"""
+    base_path = os.path.join(PREVIEW_STRIP_FOLDER, get_preview_strip_filename(filepath, filesize))
+    try:
+        with open(base_path + '.json') as f:
+            manifest = json.load(f)
+        with open(base_path + '.jpg', 'rb') as f:
+            sprite_base64 = base64.b64encode(f.read()).decode('utf-8')
+    except (OSError, ValueError):
+        return None
+
+    manifest['sprite'] = f"data:image/jpeg;base64,{sprite_base64}"
+    return manifest
+
+def create_preview_strip(video_path, relative_path):
+    """
+    Create the hover preview strip of a video with caching support
+
+    PREVIEW_STRIP_FRAMES evenly spaced frames are collected in a single
+    sequential pass, scaled to PREVIEW_STRIP_HEIGHT and packed side by side
+    into one JPEG sprite. Clips longer than PREVIEW_STRIP_SEEK_AFTER seek to
+    each frame instead, so the work stays bounded whatever the length. The
+    manifest records the frame size and the timestamp of each frame.
+
+    Returns:
+        manifest dict with 'sprite' (base64 data), or None
+    """
+    try:
+        filesize = os.path.getsize(video_path)
+
+        # Check cache first
+        cached = get_cached_preview_strip(relative_path, filesize)
+        if cached:
+            return cached
+
+        cv2 = get_cv2()
+        import numpy as np
+
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            print(f"Error: Could not open video {video_path}")
+            return None
+
+        try:
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            if total_frames <= 0:
+                print(f"Error: Unknown frame count for {video_path}")
+                return None
+
+            # Middle frame of each of the equal segments
+            count = min(PREVIEW_STRIP_FRAMES, total_frames)
+            targets = [int((i + 0.5) * total_frames / count) for i in range(count)]
+
+            frames = []
+            times = []
+
+            def add_frame(index, frame):
+                height, width = frame.shape[:2]
+                strip_width = max(1, round(width * PREVIEW_STRIP_HEIGHT / height))
+                frames.append(cv2.resize(frame, (strip_width, PREVIEW_STRIP_HEIGHT),
+                                         interpolation=cv2.INTER_AREA))
+                times.append(round(index / fps, 3) if fps > 0 else None)
+
+            if fps > 0 and total_frames / fps > PREVIEW_STRIP_SEEK_AFTER:
+                # Each seek decodes from the previous keyframe only
+                for index in targets:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+                    ret, frame = cap.read()
+                    if ret and frame is not None:
+                        add_frame(index, frame)
+            else:
+                remaining = iter(targets)
+                next_target = next(remaining)
+                for index in range(targets[-1] + 1):
+                    # grab() only demuxes/decodes; frames we skip are never converted
+                    if not cap.grab():
+                        break
+                    if index != next_target:
+                        continue
+
+                    ret, frame = cap.retrieve()
+                    if ret and frame is not None:
+                        add_frame(index, frame)
+                    next_target = next(remaining, None)
+        finally:
+            cap.release()
+
+        # The frame count in the header can overstate the real length
+        if not frames:
+            print(f"Error: Could not read frames from {video_path}")
+            return None
+
+        ok, encoded = cv2.imencode('.jpg', np.hstack(frames), [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_JPEG_QUALITY])
+        if not ok:
+            print(f"Error: Could not encode preview strip for {video_path}")
+            return None
+
+        manifest = {
+            'frames': len(frames),
+            'frame_width': frames[0].shape[1],
+            'frame_height': PREVIEW_STRIP_HEIGHT,
+            'times': times,
+            'duration': round(total_frames / fps, 3) if fps > 0 else None
+        }
+
+        # Save to cache
+        try:
+            os.makedirs(PREVIEW_STRIP_FOLDER, exist_ok=True)
+            base_path = os.path.join(PREVIEW_STRIP_FOLDER, get_preview_strip_filename(relative_path, filesize))
+            with open(base_path + '.jpg', 'wb') as f:
+                f.write(encoded.tobytes())
+            # Manifest last, so a cached manifest always has its sprite
+            with open(base_path + '.json', 'w') as f:
+                json.dump(manifest, f)
+        except OSError as e:
+            print(f"Error saving preview strip to cache for {relative_path}: {e}")
+
+        sprite_base64 = base64.b64encode(encoded.tobytes()).decode('utf-8')
+        manifest['sprite'] = f"data:image/jpeg;base64,{sprite_base64}"
+        return manifest
+
+    except Exception as e:
+        print(f"Error creating preview strip for {video_path}: {e}")
+        return None
+
 def create_folder_preview_thumbnail(folder_path, size, relative_folder_path=''):
     """
     Create a preview thumbnail for a folder from its first media file
@@ -338,6 +851,1213 @@ def create_folder_preview_thumbnail(folder_path, size, relative_folder_path=''):
         print(f"Error creating folder preview thumbnail for {folder_path}: {e}")
         return None
 
+def get_item_type(item_path):
+    """Return 'folder', 'image' or 'video' for a gallery item, or None"""
+    if os.path.isdir(item_path):
+        return 'folder'
+    if not os.path.isfile(item_path):
+        return None
+    filename = os.path.basename(item_path)
+    if allowed_file(filename):
+        return 'image'
+    if allowed_video(filename):
+        return 'video'
+    return None
+
+def get_cached_item_thumbnail(item_type, item_path, size, relative_path):
+    """
+    Look up the thumbnail fields of a gallery item without generating anything
+
+    Returns:
+        dict of listing fields ({} when the item has nothing to show),
+        or None when the thumbnail still has to be generated
+    """
+    try:
+        if item_type == 'folder':
+            media_type, media_path = get_first_media_file(item_path)
+            if not media_type:
+                return {}
+            cached = get_cached_thumbnail(relative_path, os.path.getsize(media_path), size)
+            return {'preview': cached, 'preview_type': media_type} if cached else None
+
+        cached = get_cached_thumbnail(relative_path, os.path.getsize(item_path), size)
+        return {'thumbnail': cached} if cached else None
+    except OSError:
+        return {}
+
+def get_cached_item_metadata(item_type, item_path, relative_path):
+    """Return the cached header metadata of a gallery item ({} for folders), or None"""
+    if item_type not in ('image', 'video'):
+        return {}
+    return get_media_metadata(item_type, item_path, relative_path, cached_only=True)
+
+def with_item_metadata(item_type, item_path, relative_path, fields):
+    """Add the header metadata of an image or video to its fields, extracting it if needed"""
+    if item_type not in ('image', 'video'):
+        return fields
+    return dict(get_media_metadata(item_type, item_path, relative_path), **fields)
+
+def generate_item_thumbnail(item_type, item_path, size, relative_path):
+    """Generate the thumbnail fields of a gallery item ({} when that fails)"""
+    if item_type == 'folder':
+        preview_data = create_folder_preview_thumbnail(item_path, size, relative_path)
+        if preview_data:
+            return {'preview': preview_data['thumbnail'], 'preview_type': preview_data['media_type']}
+        return {}
+
+    if item_type == 'strip':
+        # Cached on disk; the request handler only needs to know it worked
+        return {'strip': True} if create_preview_strip(item_path, relative_path) else {}
+
+    if item_type == 'image':
+        thumbnail_data = create_thumbnail(item_path, size, relative_path)
+    else:
+        thumbnail_data = create_video_thumbnail(item_path, size, relative_path)
+    return {'thumbnail': thumbnail_data} if thumbnail_data else {}
+
+class AdmissionController:
+    """
+    Caps the number of concurrent generation jobs across all workers
+
+    Each running job holds an exclusive lock on one of max_jobs slot files in
+    lock_folder, so the limit is shared by every gunicorn worker. Without
+    fcntl, or if the folder can't be created, the limit applies per process.
+    """
+
+    def __init__(self, max_jobs, lock_folder):
+        self.max_jobs = max(1, max_jobs)
+        self.lock_folder = lock_folder
+        self.semaphore = None
+
+    def _use_lock_files(self):
+        if self.semaphore is not None:
+            return False
+        if fcntl is not None:
+            try:
+                os.makedirs(self.lock_folder, exist_ok=True)
+                return True
+            except OSError as e:
+                print(f"Warning: Could not create lock folder {self.lock_folder}: {e}")
+        self.semaphore = threading.BoundedSemaphore(self.max_jobs)
+        return False
+
+    def try_acquire(self):
+        """Take a free slot without waiting; returns a handle or None"""
+        if not self._use_lock_files():
+            return True if self.semaphore.acquire(blocking=False) else None
+
+        for slot in range(self.max_jobs):
+            slot_path = os.path.join(self.lock_folder, f"slot-{slot}.lock")
+            try:
+                fd = os.open(slot_path, os.O_RDWR | os.O_CREAT, 0o666)
+            except OSError:
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except OSError:
+                os.close(fd)
+        return None
+
+    def release(self, handle):
+        if handle is True:
+            self.semaphore.release()
+        else:
+            # Closing the descriptor drops the lock
+            os.close(handle)
+
+    @contextmanager
+    def slot(self, blocking=True):
+        """Hold a slot for the duration of the block; yields whether one was obtained"""
+        handle = self.try_acquire()
+        while handle is None and blocking:
+            time.sleep(ADMISSION_RETRY_INTERVAL)
+            handle = self.try_acquire()
+        try:
+            yield handle is not None
+        finally:
+            if handle is not None:
+                self.release(handle)
+
+admission_controller = AdmissionController(GENERATION_MAX_JOBS, os.path.join(RUNTIME_FOLDER, 'slots'))
+
+class ThumbnailScheduler:
+    """
+    Priority queue of thumbnail jobs processed by background threads
+
+    Jobs are keyed by (size, relative path), so submitting a queued thumbnail
+    again only moves it to the new priority. Prefetch jobs never occupy every
+    thread, which keeps one free for thumbnails the user is looking at.
+
+    Polls reach whichever gunicorn worker answers, so a job also claims a
+    marker file in marker_folder holding the owning worker's pid. Other
+    workers leave a claimed job alone; a more urgent submit is passed to the
+    owner as a bump file in its bumps/<pid> folder, which the owner applies
+    before picking its next job. Failed generations are recorded in failed/
+    so no worker retries them until the file changes or the record expires.
+    """
+
+    def __init__(self, threads, marker_folder):
+        self.threads = max(1, threads)
+        self.marker_folder = marker_folder
+        self.failure_folder = os.path.join(marker_folder, 'failed')
+        self.pid = None
+        self.start_lock = threading.Lock()
+
+    def _reset(self):
+        self.condition = threading.Condition()
+        self.heap = []  # (priority, sequence, key), may contain superseded entries
+        self.jobs = {}  # key -> queued job
+        self.running = set()
+        self.running_prefetch = 0
+        self.results = OrderedDict()  # key -> fields of finished jobs
+        self.sequence = itertools.count()
+
+    def _ensure_started(self):
+        """Start the worker threads once per process (threads don't survive gunicorn's fork)"""
+        if self.pid == os.getpid():
+            return
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            self._reset()
+            for i in range(self.threads):
+                threading.Thread(target=self._worker, name=f"thumbnail-worker-{i}", daemon=True).start()
+            self.pid = os.getpid()
+            atexit.register(self._remove_markers)
+
+    def _marker_name(self, key):
+        size, relative_path = key
+        return hashlib.md5(f"{size}:{relative_path}".encode('utf-8')).hexdigest()
+
+    def _marker_path(self, key):
+        return os.path.join(self.marker_folder, self._marker_name(key))
+
+    def _bump_folder(self, pid):
+        return os.path.join(self.marker_folder, 'bumps', str(pid))
+
+    def _read_owner(self, marker_path):
+        """Return the pid of a live worker holding the marker, or None if it was abandoned"""
+        try:
+            with open(marker_path) as f:
+                owner = int(f.read() or 0)
+            if time.time() - os.path.getmtime(marker_path) >= THUMBNAIL_JOB_MARKER_TTL:
+                return None
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # Unreadable or still being written - assume it's live
+            return 0
+        if owner and owner != os.getpid():
+            try:
+                os.kill(owner, 0)
+            except ProcessLookupError:
+                return None
+            except OSError:
+                pass
+        return owner
+
+    def _claim(self, key, priority):
+        """
+        Return whether this worker may run the job (no other worker has it)
+
+        When another worker owns the job and this submit is more urgent, the
+        owner is asked to raise its priority.
+        """
+        marker_path = self._marker_path(key)
+        for _ in range(2):
+            try:
+                os.makedirs(self.marker_folder, exist_ok=True)
+                fd = os.open(marker_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+                with os.fdopen(fd, 'w') as f:
+                    f.write(str(os.getpid()))
+                return True
+            except FileExistsError:
+                owner = self._read_owner(marker_path)
+                if owner is not None:
+                    if owner and priority < PRIORITY_PREFETCH:
+                        self._bump(owner, key, priority)
+                    return False
+                # Left behind by a worker that died or restarted
+                try:
+                    os.remove(marker_path)
+                except OSError:
+                    pass
+            except OSError:
+                # Without a usable marker folder each worker schedules on its own
+                return True
+        return False
+
+    def _bump(self, owner, key, priority):
+        """Ask the worker that owns a job to run it at the given priority"""
+        try:
+            bump_folder = self._bump_folder(owner)
+            os.makedirs(bump_folder, exist_ok=True)
+            with open(os.path.join(bump_folder, self._marker_name(key)), 'w') as f:
+                f.write(str(priority))
+        except OSError:
+            pass
+
+    def _apply_bumps(self):
+        """Raise queued jobs other workers asked for (caller holds the condition)"""
+        bump_folder = self._bump_folder(os.getpid())
+        try:
+            names = os.listdir(bump_folder)
+        except OSError:
+            return
+        if not names:
+            return
+        queued = {self._marker_name(key): key for key in self.jobs}
+        for name in names:
+            bump_path = os.path.join(bump_folder, name)
+            try:
+                with open(bump_path) as f:
+                    priority = int(f.read())
+                os.remove(bump_path)
+            except (OSError, ValueError):
+                continue
+            key = queued.get(name)
+            if key is not None and priority < self.jobs[key]['priority']:
+                self._enqueue(key, self.jobs[key]['args'], priority)
+
+    def _release(self, key):
+        try:
+            os.remove(self._marker_path(key))
+        except OSError:
+            pass
+
+    def _remove_markers(self):
+        """Give up the markers of this worker's jobs when it exits"""
+        if self.pid != os.getpid():
+            return
+        with self.condition:
+            for key in list(self.jobs) + list(self.running):
+                self._release(key)
+        shutil.rmtree(self._bump_folder(os.getpid()), ignore_errors=True)
+
+    def _failure_signature(self, item_path):
+        stat = os.stat(item_path)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    def record_failure(self, size, relative_path, item_path):
+        """Remember that generation failed, for every worker"""
+        try:
+            os.makedirs(self.failure_folder, exist_ok=True)
+            signature = self._failure_signature(item_path)
+            with open(os.path.join(self.failure_folder, self._marker_name((size, relative_path))), 'w') as f:
+                f.write(signature)
+        except OSError:
+            pass
+
+    def failed(self, size, relative_path, item_path):
+        """Return whether a recent generation of this unchanged item failed"""
+        failure_path = os.path.join(self.failure_folder, self._marker_name((size, relative_path)))
+        try:
+            if time.time() - os.path.getmtime(failure_path) >= THUMBNAIL_FAILURE_TTL:
+                return False
+            with open(failure_path) as f:
+                return f.read() == self._failure_signature(item_path)
+        except OSError:
+            return False
+
+    def _enqueue(self, key, args, priority):
+        """Queue or re-prioritize a job (caller holds the condition)"""
+        sequence = next(self.sequence)
+        self.jobs[key] = {
+            'priority': priority,
+            'sequence': sequence,
+            'args': args
+        }
+        heapq.heappush(self.heap, (priority, sequence, key))
+        self.condition.notify()
+
+    def submit(self, item_type, item_path, size, relative_path, priority):
+        """Queue a thumbnail job, or move an already queued one to the given priority"""
+        self._ensure_started()
+        key = (size, relative_path)
+        with self.condition:
+            if key in self.running:
+                return
+            job = self.jobs.get(key)
+            if job is not None and job['priority'] == priority:
+                return
+            if job is None and not self._claim(key, priority):
+                # Queued or running in another worker; its result lands in the disk cache
+                return
+            self._enqueue(key, (item_type, item_path, size, relative_path), priority)
+
+    def pop_result(self, size, relative_path):
+        """Return and forget the fields of a finished job, or None"""
+        if self.pid != os.getpid():
+            return None
+        with self.condition:
+            return self.results.pop((size, relative_path), None)
+
+    def queue_length(self):
+        """Return (queued jobs, running jobs) of this worker"""
+        if self.pid != os.getpid():
+            return 0, 0
+        with self.condition:
+            return len(self.jobs), len(self.running)
+
+    def _next_job(self):
+        """Pop the most urgent runnable job (caller holds the condition)"""
+        if self.jobs:
+            self._apply_bumps()
+        while self.heap:
+            priority, sequence, key = self.heap[0]
+            job = self.jobs.get(key)
+            if job is None or job['sequence'] != sequence:
+                # Superseded by a later submit with a different priority
+                heapq.heappop(self.heap)
+                continue
+            if priority >= PRIORITY_PREFETCH and self.running_prefetch >= max(1, self.threads - 1):
+                return None
+            heapq.heappop(self.heap)
+            del self.jobs[key]
+            return key, job
+        return None
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                next_job = self._next_job()
+                while next_job is None:
+                    # Wake up now and then while jobs wait, to see bumps from other workers
+                    self.condition.wait(THUMBNAIL_BUMP_INTERVAL if self.jobs else None)
+                    next_job = self._next_job()
+                key, job = next_job
+                prefetch = job['priority'] >= PRIORITY_PREFETCH
+                self.running.add(key)
+                if prefetch:
+                    self.running_prefetch += 1
+
+            item_type, item_path, size, relative_path = job['args']
+            with admission_controller.slot():
+                try:
+                    result = generate_item_thumbnail(*job['args'])
+                except Exception as e:
+                    print(f"Error generating thumbnail for {relative_path}: {e}")
+                    result = {}
+                if not result:
+                    self.record_failure(size, relative_path, item_path)
+                # Listings only send metadata that is already cached
+                result = with_item_metadata(item_type, item_path, relative_path, result)
+
+            with self.condition:
+                self._release(key)
+                self.running.discard(key)
+                if prefetch:
+                    self.running_prefetch -= 1
+                self.results[key] = result
+                self.results.move_to_end(key)
+                while len(self.results) > THUMBNAIL_RESULTS_KEPT:
+                    self.results.popitem(last=False)
+                self.condition.notify_all()
+
+thumbnail_scheduler = ThumbnailScheduler(THUMBNAIL_THREADS, os.path.join(RUNTIME_FOLDER, 'thumbnail-jobs'))
+
+@contextmanager
+def exclusive_across_workers(thread_lock, lock_path, blocking):
+    """
+    Yield whether this thread got exclusive use of lock_path
+
+    thread_lock keeps other threads of this process out; an flock on
+    lock_path keeps out the other gunicorn workers (when fcntl exists).
+    """
+    if not thread_lock.acquire(blocking=blocking):
+        yield False
+        return
+    fd = None
+    try:
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+            fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o666)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except OSError:
+                yield False
+                return
+        yield True
+    finally:
+        if fd is not None:
+            os.close(fd)
+        thread_lock.release()
+
+class LibraryIndex:
+    """
+    SQLite index of every media file in the library
+
+    A background thread rescans the library every LIBRARY_SCAN_INTERVAL
+    seconds. Rescans are incremental: a folder whose mtime hasn't changed
+    keeps its indexed files and only its subfolders are visited. An flock
+    on a file next to the database lets only one worker scan at a time,
+    and the last_scan state lets the others skip a scan that just finished.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS folders (
+            path TEXT PRIMARY KEY,
+            parent TEXT,
+            mtime REAL NOT NULL,
+            total_images INTEGER NOT NULL DEFAULT 0,
+            total_videos INTEGER NOT NULL DEFAULT 0,
+            total_bytes INTEGER NOT NULL DEFAULT 0,
+            newest_mtime REAL
+        );
+        CREATE INDEX IF NOT EXISTS folders_parent ON folders(parent);
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            folder TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            name_lower TEXT NOT NULL,
+            type TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS files_folder ON files(folder);
+        CREATE INDEX IF NOT EXISTS files_name ON files(name_lower);
+        CREATE INDEX IF NOT EXISTS files_size ON files(size);
+        CREATE INDEX IF NOT EXISTS files_mtime ON files(mtime);
+        CREATE TABLE IF NOT EXISTS hashes (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime REAL NOT NULL,
+            hash INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS index_state (
+            key TEXT PRIMARY KEY,
+            value
+        );
+    """
+
+    # Bump when the schema changes; an index with another version is rebuilt
+    SCHEMA_VERSION = 2
+
+    # Folder mtime of placeholders that the next scan must list
+    UNSCANNED_MTIME = -1
+
+    def __init__(self, db_path, images_folder):
+        self.db_path = db_path
+        self.images_folder = images_folder
+        self.pid = None
+        self.start_lock = threading.Lock()
+        self.scan_lock = threading.Lock()
+        self.schema_ready = False
+
+    def connect(self, timeout=30):
+        """Open a connection, creating the schema on first use"""
+        if not self.schema_ready:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=timeout)
+        conn.row_factory = sqlite3.Row
+        if not self.schema_ready:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS index_state (key TEXT PRIMARY KEY, value)')
+            state = dict(conn.execute('SELECT key, value FROM index_state').fetchall())
+            # An index built for another images folder or schema is useless - start over
+            if (state.get('images_folder') != self.images_folder
+                    or state.get('schema_version') != self.SCHEMA_VERSION):
+                with conn:
+                    for table in ('files', 'folders', 'hashes'):
+                        conn.execute(f'DROP TABLE IF EXISTS {table}')
+                    conn.execute('DELETE FROM index_state')
+                    conn.execute("INSERT INTO index_state VALUES ('images_folder', ?)", (self.images_folder,))
+                    conn.execute("INSERT INTO index_state VALUES ('schema_version', ?)", (self.SCHEMA_VERSION,))
+            conn.executescript(self.SCHEMA)
+            self.schema_ready = True
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def get_state(self, conn, key):
+        row = conn.execute('SELECT value FROM index_state WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else None
+
+    def set_state(self, conn, key, value):
+        conn.execute('INSERT OR REPLACE INTO index_state VALUES (?, ?)', (key, value))
+
+    def start(self):
+        """Start the background scan thread once per process"""
+        if self.pid == os.getpid():
+            return
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            self.scan_lock = threading.Lock()
+            threading.Thread(target=self._scan_loop, name='library-index', daemon=True).start()
+            self.pid = os.getpid()
+
+    def _scan_loop(self):
+        # Every worker runs this loop; scans younger than the interval are
+        # skipped so the library is walked once per interval, not once per worker
+        while True:
+            delay = LIBRARY_SCAN_INTERVAL
+            try:
+                self.scan(max_age=LIBRARY_SCAN_INTERVAL)
+                age = self.scan_age()
+                if age is not None:
+                    delay = max(1, LIBRARY_SCAN_INTERVAL - age)
+            except Exception as e:
+                print(f"Error scanning library: {e}")
+            time.sleep(delay)
+
+    def scan_age(self):
+        """Seconds since the last completed scan by any worker, or None"""
+        conn = self.connect()
+        try:
+            last_scan = self.get_state(conn, 'last_scan')
+        finally:
+            conn.close()
+        return None if last_scan is None else time.time() - last_scan
+
+    def _exclusive_scan(self, blocking):
+        """Yield whether this process may scan (no other thread or worker is scanning)"""
+        return exclusive_across_workers(self.scan_lock, self.db_path + '.scan.lock', blocking)
+
+    def scan(self, blocking=False, max_age=None):
+        """
+        Bring the index up to date with the library
+
+        Args:
+            max_age: skip the scan if another one finished less than this many seconds ago
+
+        Returns:
+            bool: False if another scan was already running or is recent enough
+        """
+        with self._exclusive_scan(blocking) as may_scan:
+            if not may_scan:
+                return False
+
+            conn = self.connect()
+            try:
+                if max_age is not None:
+                    last_scan = self.get_state(conn, 'last_scan')
+                    if last_scan is not None and time.time() - last_scan < max_age:
+                        return False
+
+                known = {}
+                parents = {}
+                children = {}
+                for row in conn.execute('SELECT path, parent, mtime FROM folders'):
+                    known[row['path']] = row['mtime']
+                    parents[row['path']] = row['parent']
+                    children.setdefault(row['parent'], []).append(row['path'])
+                changed = []
+
+                seen = set()
+                visited_inodes = set()
+                stack = ['']
+                while stack:
+                    relative_folder = stack.pop()
+                    folder_path = os.path.join(self.images_folder, relative_folder) if relative_folder else self.images_folder
+                    try:
+                        folder_stat = os.stat(folder_path)
+                    except OSError:
+                        continue
+
+                    # Guard against symlink loops
+                    inode = (folder_stat.st_dev, folder_stat.st_ino)
+                    if inode in visited_inodes:
+                        continue
+                    visited_inodes.add(inode)
+                    seen.add(relative_folder)
+
+                    if known.get(relative_folder) == folder_stat.st_mtime:
+                        # Listing unchanged - reuse the indexed subfolders
+                        stack.extend(children.get(relative_folder, []))
+                        continue
+
+                    subfolders = self._index_folder(conn, relative_folder, folder_path, folder_stat.st_mtime)
+                    changed.append(relative_folder)
+                    stack.extend(f"{relative_folder}/{name}" if relative_folder else name for name in subfolders)
+
+                # Drop folders that no longer exist
+                removed = [path for path in known if path not in seen]
+                with conn:
+                    for path in removed:
+                        conn.execute('DELETE FROM folders WHERE path = ?', (path,))
+                        conn.execute('DELETE FROM files WHERE folder = ?', (path,))
+                    if removed:
+                        self.set_state(conn, 'files_updated', time.time())
+                    # Totals of changed branches are rolled up once, after the whole walk
+                    self._roll_up(conn, changed + [parents[path] for path in removed if parents[path] is not None])
+                    self.set_state(conn, 'last_scan', time.time())
+            finally:
+                conn.close()
+            return True
+
+    def _index_folder(self, conn, relative_folder, folder_path, folder_mtime):
+        """Replace the indexed contents of one folder; returns its subfolder names"""
+        subfolders = []
+        rows = []
+        try:
+            with os.scandir(folder_path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            if not entry.name.startswith('.'):
+                                subfolders.append(entry.name)
+                            continue
+                        if allowed_file(entry.name):
+                            media_type = 'image'
+                        elif allowed_video(entry.name):
+                            media_type = 'video'
+                        else:
+                            continue
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    relative_path = f"{relative_folder}/{entry.name}" if relative_folder else entry.name
+                    rows.append((relative_path, relative_folder, entry.name, entry.name.lower(),
+                                 media_type, stat.st_size, stat.st_mtime))
+        except OSError:
+            return []
+
+        parent = relative_folder.rsplit('/', 1)[0] if '/' in relative_folder else ('' if relative_folder else None)
+        with conn:
+            conn.execute('DELETE FROM files WHERE folder = ?', (relative_folder,))
+            conn.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            # Keep the recursive totals; they are recomputed by _roll_up
+            conn.execute('INSERT INTO folders (path, parent, mtime) VALUES (?, ?, ?) '
+                         'ON CONFLICT(path) DO UPDATE SET parent = excluded.parent, mtime = excluded.mtime',
+                         (relative_folder, parent, folder_mtime))
+            self.set_state(conn, 'files_updated', time.time())
+        return subfolders
+
+    def _roll_up(self, conn, folders):
+        """
+        Recompute the recursive totals of folders and all their ancestors
+
+        A folder's totals are its own files plus its subfolders' totals, so
+        the deepest folders go first and each ancestor is visited once per
+        call. Only the changed branches are touched, never the whole tree.
+        The newest mtime includes folder mtimes, so deletions show up too.
+        """
+        def depth(path):
+            return path.count('/') + 1 if path else 0
+
+        pending = set(folders)
+        while pending:
+            deepest = max(depth(path) for path in pending)
+            for path in [path for path in pending if depth(path) == deepest]:
+                pending.discard(path)
+                row = conn.execute('SELECT parent, mtime FROM folders WHERE path = ?', (path,)).fetchone()
+                if row is None:
+                    continue
+                own = conn.execute("""
+                    SELECT SUM(type = 'image'), SUM(type = 'video'), SUM(size), MAX(mtime)
+                    FROM files WHERE folder = ?
+                """, (path,)).fetchone()
+                sub = conn.execute("""
+                    SELECT SUM(total_images), SUM(total_videos), SUM(total_bytes), MAX(newest_mtime)
+                    FROM folders WHERE parent = ?
+                """, (path,)).fetchone()
+                newest = max(value for value in (row['mtime'], own[3], sub[3]) if value is not None)
+                conn.execute("""
+                    UPDATE folders SET total_images = ?, total_videos = ?, total_bytes = ?, newest_mtime = ?
+                    WHERE path = ?
+                """, ((own[0] or 0) + (sub[0] or 0), (own[1] or 0) + (sub[1] or 0),
+                      (own[2] or 0) + (sub[2] or 0), newest, path))
+                if row['parent'] is not None:
+                    pending.add(row['parent'])
+
+    def folder_stats(self, paths):
+        """
+        Return the recursive totals of indexed folders
+
+        Returns:
+            dict of path -> {'images', 'videos', 'bytes', 'newest'}; folders
+            the index hasn't reached yet are left out
+        """
+        paths = list(paths)
+        stats = {}
+        conn = self.connect(timeout=1)
+        try:
+            # Stay well below SQLite's limit on bound parameters
+            for start in range(0, len(paths), 500):
+                chunk = paths[start:start + 500]
+                for row in conn.execute(f"""
+                    SELECT path, total_images, total_videos, total_bytes, newest_mtime FROM folders
+                    WHERE path IN ({', '.join('?' for _ in chunk)}) AND mtime != ?
+                """, chunk + [self.UNSCANNED_MTIME]):
+                    stats[row['path']] = {
+                        'images': row['total_images'],
+                        'videos': row['total_videos'],
+                        'bytes': row['total_bytes'],
+                        'newest': row['newest_mtime']
+                    }
+        finally:
+            conn.close()
+        return stats
+
+    def refresh_folder(self, relative_folder):
+        """
+        Re-index a single folder if its listing changed since the last scan
+
+        Called from request handlers that are looking at the folder anyway,
+        so it gives up quickly instead of waiting for a running scan.
+        """
+        self.refresh_folders([relative_folder])
+
+    def refresh_folders(self, relative_folders):
+        """Re-index the given folders whose listing changed, with one roll-up for all of them"""
+        try:
+            conn = self.connect(timeout=1)
+        except sqlite3.Error as e:
+            print(f"Warning: Could not open index to refresh folders: {e}")
+            return
+        try:
+            changed = []
+            for relative_folder in relative_folders:
+                relative_folder = relative_folder.strip('/')
+                folder_path = get_safe_path(relative_folder)
+                if relative_folder and folder_path == self.images_folder:
+                    continue
+                try:
+                    folder_mtime = os.stat(folder_path).st_mtime
+                except OSError as e:
+                    print(f"Warning: Could not refresh index for folder '{relative_folder}': {e}")
+                    continue
+                row = conn.execute('SELECT mtime FROM folders WHERE path = ?', (relative_folder,)).fetchone()
+                if row is None and relative_folder:
+                    # Not reached by a scan yet; the next scan will pick it up
+                    continue
+                if row is None or row['mtime'] != folder_mtime:
+                    subfolders = self._index_folder(conn, relative_folder, folder_path, folder_mtime)
+                    with conn:
+                        # The scan won't re-list this folder now that its mtime is
+                        # stored, so new subfolders get a placeholder it walks into
+                        conn.executemany(
+                            'INSERT OR IGNORE INTO folders (path, parent, mtime) VALUES (?, ?, ?)',
+                            [(f"{relative_folder}/{name}" if relative_folder else name, relative_folder,
+                              self.UNSCANNED_MTIME) for name in subfolders])
+                    changed.append(relative_folder)
+            if changed:
+                with conn:
+                    self._roll_up(conn, changed)
+        except sqlite3.Error as e:
+            print(f"Warning: Could not refresh index for folders: {e}")
+        finally:
+            conn.close()
+
+    def stats(self):
+        """Return counts of the indexed library (no filesystem access)"""
+        conn = self.connect(timeout=1)
+        try:
+            totals = conn.execute("""
+                SELECT total_images, total_videos, total_bytes, newest_mtime FROM folders WHERE path = ''
+            """).fetchone() or (0, 0, 0, None)
+            root = conn.execute("""
+                SELECT
+                    (SELECT COUNT(*) FROM files WHERE folder = '' AND type = 'image'),
+                    (SELECT COUNT(*) FROM files WHERE folder = '' AND type = 'video'),
+                    (SELECT COUNT(*) FROM folders WHERE parent = '')
+            """).fetchone()
+            folders = conn.execute('SELECT COUNT(*) FROM folders WHERE mtime != ?',
+                                   (self.UNSCANNED_MTIME,)).fetchone()[0]
+            last_scan = self.get_state(conn, 'last_scan')
+        finally:
+            conn.close()
+
+        return {
+            # Maintained by _roll_up, so this is a single row lookup
+            'images': totals[0],
+            'videos': totals[1],
+            'bytes': totals[2],
+            'newest': totals[3],
+            # The root folder itself isn't counted
+            'folders': max(0, folders - 1),
+            'root': {'images': root[0], 'videos': root[1], 'subfolders': root[2]},
+            # None until the first scan has finished
+            'indexed_at': last_scan
+        }
+
+    def search(self, query='', pattern=None, media_types=None, min_size=None, max_size=None,
+               modified_after=None, modified_before=None, sort='name', page=1, per_page=SEARCH_PAGE_SIZE):
+        """
+        Query the index
+
+        Returns:
+            tuple: (list of result dicts, total number of matches)
+        """
+        clauses = []
+        params = []
+        if query:
+            escaped = query.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            clauses.append("name_lower LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+        if pattern:
+            clauses.append('name_lower GLOB ?')
+            params.append(pattern.lower())
+        # Range filters match large parts of the library, where walking an
+        # index costs a random row lookup per match. The unary '+' keeps SQLite
+        # on a single sequential scan for those instead.
+        if media_types:
+            clauses.append(f"+type IN ({', '.join('?' for _ in media_types)})")
+            params.extend(media_types)
+        if min_size is not None:
+            clauses.append('+size >= ?')
+            params.append(min_size)
+        if max_size is not None:
+            clauses.append('+size <= ?')
+            params.append(max_size)
+        if modified_after is not None:
+            clauses.append('+mtime >= ?')
+            params.append(modified_after)
+        if modified_before is not None:
+            clauses.append('+mtime <= ?')
+            params.append(modified_before)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        direction = 'DESC' if sort.startswith('-') else 'ASC'
+        column = SEARCH_SORT_COLUMNS[sort.lstrip('-')]
+        # Unfiltered listings read pages straight off the sort index; filtered
+        # ones sort the matches of the scan (a top-N sort with LIMIT)
+        if clauses:
+            column = f'+{column}'
+
+        conn = self.connect()
+        try:
+            total = conn.execute(f'SELECT COUNT(*) FROM files {where}', params).fetchone()[0]
+            rows = conn.execute(
+                f'SELECT path, folder, filename, type, size, mtime FROM files {where} '
+                f'ORDER BY {column} {direction}, path LIMIT ? OFFSET ?',
+                params + [per_page, (page - 1) * per_page]
+            ).fetchall()
+        finally:
+            conn.close()
+
+        results = [{
+            'type': row['type'],
+            'filename': row['filename'],
+            'path': row['path'],
+            'folder': row['folder'],
+            'size': row['size'],
+            'modified': row['mtime']
+        } for row in rows]
+        return results, total
+
+library_index = LibraryIndex(LIBRARY_INDEX_PATH, IMAGES_FOLDER)
+
+def compute_image_hash(image_path):
+    """
+    64-bit difference hash (dHash) of an image
+
+    Each bit says whether a pixel of the 9x8 grayscale image is brighter than
+    its right neighbour. JPEGs are decoded in draft mode, so hashing a
+    cached thumbnail or a full-size photo costs about the same.
+    """
+    with Image.open(image_path) as img:
+        img.draft('L', (64, 64))
+        img = ImageOps.exif_transpose(img).convert('L')
+        pixels = list(img.resize((9, 8), Image.Resampling.BOX).getdata())
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+def find_duplicate_groups(hashes, max_distance):
+    """
+    Group 64-bit hashes that are within max_distance bits of each other
+
+    Args:
+        hashes: NumPy uint64 array
+        max_distance: Hamming distance (at most DUPLICATE_DISTANCE_LIMIT)
+
+    Returns:
+        list of index arrays into hashes, one per group of two or more
+
+    Identical hashes are merged first. The distinct ones are compared by
+    multi-index hashing: split into three chunks, two hashes within
+    max_distance bits have a chunk within max_distance // 3 bits of each
+    other, so only hashes landing in a probed chunk bucket are compared.
+    Candidates are checked with a vectorized popcount and the matches are
+    joined into groups by label propagation.
+    """
+    import numpy as np
+
+    unique, inverse = np.unique(np.asarray(hashes, dtype=np.uint64), return_inverse=True)
+    count = len(unique)
+    popcount = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+    radius = max_distance // 3
+
+    left = []
+    right = []
+    for shift, bits in ((0, 22), (22, 21), (43, 21)):
+        values = ((unique >> np.uint64(shift)) & np.uint64((1 << bits) - 1)).astype(np.int64)
+        order = np.argsort(values, kind='stable')
+        sorted_values = values[order]
+        bucket_count = np.bincount(values, minlength=1 << bits).astype(np.int32)
+        bucket_start = (np.cumsum(bucket_count) - bucket_count).astype(np.int32)
+
+        masks = [sum(1 << bit for bit in flipped)
+                 for r in range(radius + 1) for flipped in itertools.combinations(range(bits), r)]
+        for mask in masks:
+            # Probe in sorted order (table lookups stay mostly sequential), and
+            # only from the side of each pair that has the lowest flipped bit
+            # clear: exactly one side does, whatever the other flipped bits
+            probing = order if mask == 0 else order[(sorted_values & (mask & -mask)) == 0]
+            probe = values[probing] ^ mask
+            counts = bucket_count[probe]
+            starts = bucket_start[probe]
+            ends = np.cumsum(counts, dtype=np.int64)
+
+            # Expand candidate pairs in blocks so crowded buckets can't exhaust memory
+            block_start = 0
+            while block_start < len(probing):
+                done = ends[block_start - 1] if block_start else 0
+                block_end = max(block_start + 1, int(np.searchsorted(ends, done + 4000000, 'right')))
+                block_counts = counts[block_start:block_end]
+                total = int(block_counts.sum())
+                if total:
+                    src = np.repeat(probing[block_start:block_end], block_counts)
+                    offsets = np.arange(total) - np.repeat(np.cumsum(block_counts) - block_counts, block_counts)
+                    dst = order[np.repeat(starts[block_start:block_end], block_counts) + offsets]
+                    if mask == 0:
+                        keep = src < dst
+                        src = src[keep]
+                        dst = dst[keep]
+                    distance = popcount[(unique[src] ^ unique[dst]).view(np.uint8)].reshape(-1, 8).sum(axis=1)
+                    close = distance <= max_distance
+                    left.append(src[close])
+                    right.append(dst[close])
+                block_start = block_end
+
+    labels = np.arange(count)
+    if left:
+        a = np.concatenate(left)
+        b = np.concatenate(right)
+        while len(a):
+            low = np.minimum(labels[a], labels[b])
+            updated = labels.copy()
+            np.minimum.at(updated, a, low)
+            np.minimum.at(updated, b, low)
+            updated = updated[updated]
+            if np.array_equal(updated, labels):
+                break
+            labels = updated
+
+    # Expand back to every file and keep groups of two or more
+    file_labels = labels[inverse]
+    sizes = np.bincount(file_labels, minlength=count)
+    members = np.flatnonzero(sizes[file_labels] > 1)
+    members = members[np.argsort(file_labels[members], kind='stable')]
+    boundaries = np.flatnonzero(np.diff(file_labels[members])) + 1
+    return np.split(members, boundaries) if len(members) else []
+
+class DuplicateFinder:
+    """
+    Perceptual hashes of every image in the library index
+
+    A background thread hashes new and changed images in batches, one
+    worker at a time, taking an admission slot per image. A cached
+    thumbnail is hashed instead of the original when one exists. Duplicate
+    groups are computed from all hashes at once and kept until the index or
+    the hashes change.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.pid = None
+        self.start_lock = threading.Lock()
+        self.hash_lock = threading.Lock()
+        self.groups_lock = threading.Lock()
+        self.groups_key = None
+        self.groups = None
+
+    def start(self):
+        """Start the background hashing thread once per process"""
+        if not DUPLICATE_DETECTION or self.pid == os.getpid():
+            return
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            self.hash_lock = threading.Lock()
+            threading.Thread(target=self._hash_loop, name='duplicate-hashes', daemon=True).start()
+            self.pid = os.getpid()
+
+    def _hash_loop(self):
+        # Wait for the library index to be built before the first batch
+        indexed = False
+        while True:
+            try:
+                if not indexed:
+                    self.index.scan(blocking=True, max_age=LIBRARY_SCAN_INTERVAL)
+                    indexed = True
+                # Later changes arrive through the library index's own rescans
+                while self.hash_pending():
+                    pass
+            except Exception as e:
+                print(f"Error hashing images: {e}")
+            time.sleep(LIBRARY_SCAN_INTERVAL)
+
+    def find_hash_source(self, relative_path, filesize, cache_sizes):
+        """Return the largest cached thumbnail of an image, or the image itself"""
+        for size in cache_sizes:
+            cache_path = os.path.join(CACHE_FOLDER, str(size), get_cache_filename(relative_path, filesize, size))
+            if os.path.exists(cache_path):
+                return cache_path
+        return os.path.join(self.index.images_folder, relative_path)
+
+    def hash_pending(self, limit=DUPLICATE_HASH_BATCH):
+        """
+        Hash up to limit new or changed images
+
+        Returns:
+            number of images hashed, or None if another worker is hashing
+        """
+        with exclusive_across_workers(self.hash_lock, self.index.db_path + '.hash.lock', blocking=False) as may_hash:
+            if not may_hash:
+                return None
+
+            conn = self.index.connect()
+            try:
+                rows = conn.execute("""
+                    SELECT f.path, f.size, f.mtime FROM files f
+                    LEFT JOIN hashes h ON h.path = f.path
+                    WHERE f.type = 'image' AND (h.path IS NULL OR h.size != f.size OR h.mtime != f.mtime)
+                    LIMIT ?
+                """, (limit,)).fetchall()
+
+                if not rows:
+                    with conn:
+                        removed = conn.execute('DELETE FROM hashes WHERE path NOT IN (SELECT path FROM files)').rowcount
+                        if removed:
+                            self.index.set_state(conn, 'hashes_updated', time.time())
+                    return 0
+
+                try:
+                    cache_sizes = sorted((int(item) for item in os.listdir(CACHE_FOLDER) if item.isdigit()), reverse=True)
+                except OSError:
+                    cache_sizes = []
+
+                results = []
+                for row in rows:
+                    source = self.find_hash_source(row['path'], row['size'], cache_sizes)
+                    with admission_controller.slot():
+                        try:
+                            value = compute_image_hash(source)
+                            # SQLite integers are signed 64-bit
+                            value = value - (1 << 64) if value >= 1 << 63 else value
+                        except Exception as e:
+                            # Stored as NULL so broken files aren't retried every batch
+                            print(f"Error hashing {row['path']}: {e}")
+                            value = None
+                    results.append((row['path'], row['size'], row['mtime'], value))
+
+                with conn:
+                    conn.executemany('INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)', results)
+                    self.index.set_state(conn, 'hashes_updated', time.time())
+                return len(results)
+            finally:
+                conn.close()
+
+    def progress(self):
+        """Return (images hashed, images in the index)"""
+        conn = self.index.connect()
+        try:
+            hashed = conn.execute("""
+                SELECT COUNT(*) FROM hashes h JOIN files f ON f.path = h.path
+                WHERE h.size = f.size AND h.mtime = f.mtime
+            """).fetchone()[0]
+            images = conn.execute("SELECT COUNT(*) FROM files WHERE type = 'image'").fetchone()[0]
+        finally:
+            conn.close()
+        return hashed, images
+
+    def find_groups(self, max_distance=DUPLICATE_MAX_DISTANCE):
+        """
+        Group current images whose hashes are within max_distance bits
+
+        Returns:
+            list of groups, largest first; each a list of file dicts sorted by path
+        """
+        import numpy as np
+
+        conn = self.index.connect()
+        try:
+            key = (max_distance, self.index.get_state(conn, 'files_updated'),
+                   self.index.get_state(conn, 'hashes_updated'))
+            with self.groups_lock:
+                if key == self.groups_key:
+                    return self.groups
+
+            rows = conn.execute("""
+                SELECT f.path, f.folder, f.filename, f.size, f.mtime, h.hash FROM hashes h
+                JOIN files f ON f.path = h.path AND f.size = h.size AND f.mtime = h.mtime
+                WHERE h.hash IS NOT NULL
+            """).fetchall()
+        finally:
+            conn.close()
+
+        hashes = np.array([row['hash'] for row in rows], dtype=np.int64).view(np.uint64)
+        groups = []
+        for members in find_duplicate_groups(hashes, max_distance):
+            files = [{
+                'filename': rows[i]['filename'],
+                'path': rows[i]['path'],
+                'folder': rows[i]['folder'],
+                'size': rows[i]['size'],
+                'modified': rows[i]['mtime']
+            } for i in members]
+            files.sort(key=lambda item: item['path'])
+            groups.append(files)
+        groups.sort(key=lambda files: (-len(files), files[0]['path']))
+
+        with self.groups_lock:
+            self.groups_key = key
+            self.groups = groups
+        return groups
+
+duplicate_finder = DuplicateFinder(library_index)
+
+def parse_date_arg(value):
+    """Parse a unix timestamp or ISO 8601 date/time query argument into a timestamp"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+@app.before_request
+def start_background_workers():
+    """Start per-process background threads on the first request after fork"""
+    library_index.start()
+    duplicate_finder.start()
+
+@app.after_request
+def compress_response(response):
+    """Compress JSON responses when the client supports gzip or brotli"""
+    if (response.mimetype != 'application/json'
+            or response.status_code != 200
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_SIZE:
+        return response
+
+    supported = ['br', 'gzip'] if brotli else ['gzip']
+    encoding = request.accept_encodings.best_match(supported)
+    if not encoding:
+        return response
+
+    try:
+        response.set_data(get_compressed_payload(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+    except Exception as e:
+        print(f"Error compressing response for {request.path}: {e}")
+
+    return response
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     """Login page"""
@@ -384,6 +2104,13 @@ def index(subfolder=''):
                          current_folder=subfolder,
                          breadcrumbs=breadcrumbs)
 
+@app.route('/duplicates')
+@login_required
+def duplicates_view():
+    """Page listing groups of near-identical images"""
+    return render_template('duplicates.html', max_distance=DUPLICATE_MAX_DISTANCE,
+                           distance_limit=DUPLICATE_DISTANCE_LIMIT)
+
 @app.route('/api/thumbnails/<int:size>')
 @app.route('/api/thumbnails/<int:size>/<path:subfolder>')
 @login_required
@@ -395,10 +2122,75 @@ def get_thumbnails(size, subfolder=''):
     # Clean up cache for other sizes (only keep current size)
     cleanup_old_cache(size)
 
+    # Number of leading items the client can see. Those are generated before
+    # responding while within the generation budget and the rest are queued;
+    # without it everything is generated (budget permitting).
+    visible = request.args.get('visible', type=int)
+    sort = request.args.get('sort', 'name')
+    if sort not in LISTING_SORTS:
+        sort = 'name'
+
     current_path = get_safe_path(subfolder)
     subfolders, images, videos = get_folder_contents(current_path)
     thumbnails = []
 
+    def relative(name):
+        return f"{subfolder}/{name}" if subfolder else name
+
+    # Header metadata lets the client reserve layout space before thumbnails arrive.
+    # Only cached metadata is sent; the rest is read by the thumbnail jobs and polled.
+    image_metadata = {image: get_cached_item_metadata('image', os.path.join(current_path, image), relative(image))
+                      for image in images}
+    video_metadata = {video: get_cached_item_metadata('video', os.path.join(current_path, video), relative(video))
+                      for video in videos}
+
+    if sort != 'name':
+        def capture_time(name, metadata):
+            # Fall back to the file's modification time when there is no (cached) capture date
+            if metadata[name] and metadata[name].get('taken'):
+                return metadata[name]['taken']
+            try:
+                mtime = os.path.getmtime(os.path.join(current_path, name))
+                return datetime.fromtimestamp(mtime).isoformat(timespec='seconds')
+            except OSError:
+                return ''
+
+        images.sort(key=lambda name: capture_time(name, image_metadata), reverse=sort == '-taken')
+        videos.sort(key=lambda name: capture_time(name, video_metadata), reverse=sort == '-taken')
+
+    # Keep the search index current for the folder being looked at
+    library_index.refresh_folder(subfolder)
+
+    def resolve_thumbnail(item_type, item_path, relative_path, metadata):
+        """Return (fields, pending) for the next item in listing order"""
+        fields = get_cached_item_thumbnail(item_type, item_path, size, relative_path)
+        if fields is None and thumbnail_scheduler.failed(size, relative_path, item_path):
+            fields = {}
+        if fields is not None and metadata is not None:
+            return dict(metadata, **fields), False
+        if visible is None or len(thumbnails) < visible:
+            with admission_controller.slot(blocking=False) as admitted:
+                if admitted:
+                    if fields is None:
+                        fields = generate_item_thumbnail(item_type, item_path, size, relative_path)
+                        if not fields:
+                            thumbnail_scheduler.record_failure(size, relative_path, item_path)
+                    return with_item_metadata(item_type, item_path, relative_path, fields), False
+            # Over the generation budget - send a placeholder instead of waiting
+            priority = PRIORITY_VISIBLE
+        else:
+            priority = PRIORITY_PREFETCH
+        thumbnail_scheduler.submit(item_type, item_path, size, relative_path, priority)
+        return dict(metadata or {}, **(fields or {})), True
+
+    # Recursive totals maintained by the index, so tiles need no walk
+    try:
+        folder_stats = library_index.folder_stats(
+            f"{subfolder}/{folder}" if subfolder else folder for folder in subfolders)
+    except sqlite3.Error as e:
+        print(f"Warning: Could not read folder statistics: {e}")
+        folder_stats = {}
+
     # Add subfolders with preview thumbnails
     for folder in subfolders:
         folder_path = os.path.join(current_path, folder)
@@ -410,13 +2202,15 @@ def get_thumbnails(size, subfolder=''):
             'path': relative_folder_path,
             'size': size
         }
+        if relative_folder_path in folder_stats:
+            folder_obj['stats'] = folder_stats[relative_folder_path]
 
         # Try to generate folder preview thumbnail
         try:
-            preview_data = create_folder_preview_thumbnail(folder_path, size, relative_folder_path)
-            if preview_data:
-                folder_obj['preview'] = preview_data['thumbnail']
-                folder_obj['preview_type'] = preview_data['media_type']
+            fields, pending = resolve_thumbnail('folder', folder_path, relative_folder_path, {})
+            folder_obj.update(fields)
+            if pending:
+                folder_obj['pending'] = True
         except Exception as e:
             print(f"Error creating folder preview for {folder}: {e}")
             # Will fall back to folder icon in frontend
@@ -427,35 +2221,35 @@ def get_thumbnails(size, subfolder=''):
     for image in images:
         image_path = os.path.join(current_path, image)
         relative_path = f"{subfolder}/{image}" if subfolder else image
-        thumbnail_data = create_thumbnail(image_path, size, relative_path)
-        if thumbnail_data:
-            thumbnails.append({
+        fields, pending = resolve_thumbnail('image', image_path, relative_path, image_metadata[image])
+        if 'thumbnail' in fields or pending:
+            image_obj = {
                 'type': 'image',
                 'filename': image,
-                'thumbnail': thumbnail_data,
                 'path': relative_path
-            })
+            }
+            image_obj.update(fields)
+            if pending:
+                image_obj['pending'] = True
+            thumbnails.append(image_obj)
 
     # Add video thumbnails
     for video in videos:
         video_path = os.path.join(current_path, video)
         relative_path = f"{subfolder}/{video}" if subfolder else video
-        thumbnail_data = create_video_thumbnail(video_path, size, relative_path)
-        if thumbnail_data:
-            thumbnails.append({
-                'type': 'video',
-                'filename': video,
-                'thumbnail': thumbnail_data,
-                'path': relative_path
-            })
-        else:
-            # Fallback to icon if thumbnail generation fails
-            thumbnails.append({
-                'type': 'video',
-                'filename': video,
-                'path': relative_path,
-                'size': size
-            })
+        fields, pending = resolve_thumbnail('video', video_path, relative_path, video_metadata[video])
+        video_obj = {
+            'type': 'video',
+            'filename': video,
+            'path': relative_path
+        }
+        video_obj.update(fields)
+        if 'thumbnail' not in fields:
+            # Frontend shows an icon until (or unless) a thumbnail exists
+            video_obj['size'] = size
+        if pending:
+            video_obj['pending'] = True
+        thumbnails.append(video_obj)
 
     response = jsonify(thumbnails)
 
@@ -466,6 +2260,171 @@ def get_thumbnails(size, subfolder=''):
 
     return response
 
+@app.route('/api/thumbnails/poll/<int:size>', methods=['POST'])
+@login_required
+def poll_thumbnails(size):
+    """
+    API endpoint to collect queued thumbnails and report which are on screen
+
+    Expects JSON {"paths": [...pending paths...], "visible": [...subset on screen...]}.
+    Visible paths jump to the front of the generation queue; the others are
+    moved back to prefetch priority. Ready images and videos carry their
+    header metadata, so a path stays pending until that is cached as well.
+    """
+    size = max(50, min(400, size))
+
+    data = request.get_json(silent=True) or {}
+    paths = data.get('paths') or []
+    visible = set(data.get('visible') or [])
+
+    ready = []
+    pending = []
+
+    for relative_path in paths[:THUMBNAIL_POLL_LIMIT]:
+        if not isinstance(relative_path, str):
+            continue
+
+        item_path = get_safe_path(relative_path)
+        item_type = get_item_type(item_path) if item_path != IMAGES_FOLDER else None
+        if not item_type:
+            # Deleted or invalid - report it so the client stops waiting
+            ready.append({'path': relative_path})
+            continue
+
+        fields = thumbnail_scheduler.pop_result(size, relative_path)
+        if fields is None:
+            fields = get_cached_item_thumbnail(item_type, item_path, size, relative_path)
+            if fields is None and thumbnail_scheduler.failed(size, relative_path, item_path):
+                # Failed in some worker - stop waiting instead of generating it again
+                fields = {}
+            if fields is not None:
+                # Pending until the job has read the header metadata too
+                metadata = get_cached_item_metadata(item_type, item_path, relative_path)
+                fields = None if metadata is None else dict(metadata, **fields)
+
+        if fields is None:
+            priority = PRIORITY_VISIBLE if relative_path in visible else PRIORITY_PREFETCH
+            thumbnail_scheduler.submit(item_type, item_path, size, relative_path, priority)
+            pending.append(relative_path)
+        else:
+            ready.append(dict(fields, path=relative_path, type=item_type))
+
+    response = jsonify({'ready': ready, 'pending': pending})
+    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    response.headers['Pragma'] = 'no-cache'
+    response.headers['Expires'] = '0'
+
+    return response
+
+@app.route('/api/search')
+@login_required
+def search_library():
+    """
+    API endpoint to search the whole library through the prebuilt index
+
+    Query arguments: q (filename substring), glob (filename pattern), type
+    (image/video, comma separated), min_size/max_size (bytes),
+    modified_after/modified_before (timestamp or ISO date), sort (name, path,
+    size or modified, '-' prefix for descending), page and per_page.
+    Thumbnails for results can be fetched with /api/thumbnails/poll/<size>.
+    """
+    try:
+        media_types = [t for t in request.args.get('type', '').split(',') if t]
+        if any(t not in ('image', 'video') for t in media_types):
+            raise ValueError('type must be image and/or video')
+
+        sort = request.args.get('sort', 'name')
+        if sort.lstrip('-') not in SEARCH_SORT_COLUMNS:
+            raise ValueError(f"sort must be one of {', '.join(SEARCH_SORT_COLUMNS)}")
+
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = max(1, min(SEARCH_MAX_PAGE_SIZE, int(request.args.get('per_page', SEARCH_PAGE_SIZE))))
+        min_size = request.args.get('min_size')
+        max_size = request.args.get('max_size')
+
+        results, total = library_index.search(
+            query=request.args.get('q', '').strip(),
+            pattern=request.args.get('glob') or None,
+            media_types=media_types,
+            min_size=int(min_size) if min_size else None,
+            max_size=int(max_size) if max_size else None,
+            modified_after=parse_date_arg(request.args.get('modified_after')),
+            modified_before=parse_date_arg(request.args.get('modified_before')),
+            sort=sort,
+            page=page,
+            per_page=per_page
+        )
+
+        conn = library_index.connect()
+        try:
+            indexed_at = library_index.get_state(conn, 'last_scan')
+        finally:
+            conn.close()
+    except (ValueError, OverflowError) as e:
+        # OverflowError: a number too large for SQLite to bind
+        return jsonify({'error': f'Invalid search parameters: {e}'}), 400
+    except sqlite3.Error as e:
+        print(f"Error searching library: {e}")
+        return jsonify({'error': 'Search index unavailable'}), 503
+
+    response = jsonify({
+        'results': results,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        # None until the first scan has finished
+        'indexed_at': indexed_at
+    })
+    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    response.headers['Pragma'] = 'no-cache'
+    response.headers['Expires'] = '0'
+
+    return response
+
+@app.route('/api/duplicates')
+@login_required
+def list_duplicates():
+    """
+    API endpoint listing groups of near-identical images, largest first
+
+    Query arguments: distance (differing bits out of the 64-bit hash, up to
+    DUPLICATE_DISTANCE_LIMIT), page and per_page. Only images hashed so far
+    are grouped; 'hashed' and 'images' report the progress.
+    """
+    try:
+        distance = int(request.args.get('distance', DUPLICATE_MAX_DISTANCE))
+        if not 0 <= distance <= DUPLICATE_DISTANCE_LIMIT:
+            raise ValueError(f'distance must be between 0 and {DUPLICATE_DISTANCE_LIMIT}')
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = max(1, min(DUPLICATE_MAX_PAGE_SIZE, int(request.args.get('per_page', DUPLICATE_PAGE_SIZE))))
+
+        groups = duplicate_finder.find_groups(distance)
+        hashed, images = duplicate_finder.progress()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameters: {e}'}), 400
+    except sqlite3.Error as e:
+        print(f"Error finding duplicates: {e}")
+        return jsonify({'error': 'Search index unavailable'}), 503
+
+    start = (page - 1) * per_page
+    response = jsonify({
+        'groups': groups[start:start + per_page],
+        'total_groups': len(groups),
+        # Files that could go while keeping one of each group
+        'redundant_files': sum(len(group) - 1 for group in groups),
+        'distance': distance,
+        'page': page,
+        'per_page': per_page,
+        'hashed': hashed,
+        'images': images,
+        'enabled': DUPLICATE_DETECTION
+    })
+    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    response.headers['Pragma'] = 'no-cache'
+    response.headers['Expires'] = '0'
+
+    return response
+
 @app.route('/images/<path:filepath>')
 @login_required
 def serve_image(filepath):
@@ -514,16 +2473,188 @@ def serve_video(filepath):
     
     return response
 
+@app.route('/api/preview-strip/<path:filepath>')
+@login_required
+def get_preview_strip(filepath):
+    """
+    API endpoint for the hover preview strip of a video (JSON manifest with sprite)
+
+    Strips are built by the background thumbnail threads, never inside the
+    request: until one is cached the response is 202 with Retry-After.
+    """
+    full_path = os.path.normpath(os.path.join(IMAGES_FOLDER, filepath))
+
+    # Security check - ensure path is within images folder
+    if not full_path.startswith(IMAGES_FOLDER.rstrip(os.sep) + os.sep):
+        return jsonify({'error': 'Access denied'}), 403
+
+    if not os.path.isfile(full_path) or not allowed_video(os.path.basename(full_path)):
+        return jsonify({'error': 'Video not found'}), 404
+
+    relative_path = os.path.relpath(full_path, IMAGES_FOLDER).replace(os.sep, '/')
+    strip = get_cached_preview_strip(relative_path, os.path.getsize(full_path))
+    if strip is None:
+        # A finished job without a cached strip means generation failed
+        # Keyed apart from the video's thumbnails, whatever their size
+        result = thumbnail_scheduler.pop_result('strip', relative_path)
+        if (result is not None and not result) or thumbnail_scheduler.failed('strip', relative_path, full_path):
+            return jsonify({'error': 'Failed to create preview strip'}), 500
+
+        thumbnail_scheduler.submit('strip', full_path, 'strip', relative_path, PRIORITY_VISIBLE)
+        response = jsonify({'pending': True})
+        response.headers['Retry-After'] = '1'
+        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+        return response, 202
+
+    response = jsonify(strip)
+
+    # Add no-cache headers to prevent browser caching
+    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    response.headers['Pragma'] = 'no-cache'
+    response.headers['Expires'] = '0'
+
+    return response
+
 @app.route('/health')
 def health_check():
-    """Health check endpoint"""
-    subfolders, images, videos = get_folder_contents(IMAGES_FOLDER)
+    """
+    Health check endpoint
+
+    Root folder counts come from the library index, so this never waits on
+    the images mount. Use /health/live for container health checks.
+    """
+    try:
+        root = library_index.stats()['root']
+    except sqlite3.Error as e:
+        print(f"Warning: Could not read library index for health check: {e}")
+        root = {'images': 0, 'videos': 0, 'subfolders': 0}
+
     return jsonify({
         'status': 'healthy', 
-        'images_count': len(images),
-        'videos_count': len(videos),
-        'subfolders_count': len(subfolders)
+        'images_count': root['images'],
+        'videos_count': root['videos'],
+        'subfolders_count': root['subfolders']
+    })
+
+@app.route('/health/live')
+def health_live():
+    """Liveness endpoint - answers without touching the filesystem"""
+    return jsonify({'status': 'alive'})
+
+_readiness_checks = {}
+_readiness_lock = threading.Lock()
+
+def run_readiness_check(name, check):
+    """
+    Run check() with READINESS_TIMEOUT and return None or an error message
+
+    A check stuck on a stalled mount is reported as failed and isn't
+    started again until the stuck call returns, so threads can't pile up.
+    """
+    with _readiness_lock:
+        running = _readiness_checks.get(name)
+        if running is not None and running.is_alive():
+            return "previous check still hasn't returned"
+
+        result = {}
+
+        def target():
+            try:
+                check()
+            except Exception as e:
+                result['error'] = str(e) or e.__class__.__name__
+
+        thread = threading.Thread(target=target, name=f'readiness-{name}', daemon=True)
+        _readiness_checks[name] = thread
+        thread.start()
+
+    thread.join(READINESS_TIMEOUT)
+    if thread.is_alive():
+        return f'timed out after {READINESS_TIMEOUT:g}s'
+    return result.get('error')
+
+def check_images_mount():
+    """The images folder exists and can be listed"""
+    if not os.path.isdir(IMAGES_FOLDER):
+        raise OSError(f'{IMAGES_FOLDER} is not a directory')
+    with os.scandir(IMAGES_FOLDER) as entries:
+        next(entries, None)
+
+def check_folder_writable(folder):
+    """A file can be created in folder (creating the folder if needed)"""
+    os.makedirs(folder, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=folder, prefix='.ready-') as f:
+        f.write(b'ok')
+        f.flush()
+
+@app.route('/health/ready')
+def health_ready():
+    """
+    Readiness endpoint - 503 unless the images mount and the runtime folder are usable
+
+    A read-only images mount is supported (caching is disabled), so an
+    unwritable cache only reports the status as 'degraded'.
+    """
+    checks = {
+        'images_mount': check_images_mount,
+        'cache_writable': lambda: check_folder_writable(CACHE_FOLDER),
+        'runtime_writable': lambda: check_folder_writable(RUNTIME_FOLDER),
+    }
+    required = ('images_mount', 'runtime_writable')
+    results = {name: run_readiness_check(name, check) or 'ok' for name, check in checks.items()}
+    ready = all(results[name] == 'ok' for name in required)
+    if not ready:
+        status = 'not ready'
+    elif results['cache_writable'] != 'ok':
+        status = 'degraded'
+    else:
+        status = 'ready'
+
+    response = jsonify({'status': status, 'checks': results})
+    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    return response, 200 if ready else 503
+
+@app.route('/health/stats')
+def health_stats():
+    """
+    Library counts and warm-up progress
+
+    Served from the library index and in-memory counters, never from a
+    scan. Worker figures cover only the gunicorn worker that answered.
+    """
+    try:
+        library = library_index.stats()
+        hashed, hash_total = duplicate_finder.progress()
+    except sqlite3.Error as e:
+        print(f"Warning: Could not read library index for stats: {e}")
+        library = None
+        hashed = hash_total = None
+
+    queued, running = thumbnail_scheduler.queue_length()
+    with _worker_counters_lock:
+        counters = dict(worker_counters)
+    lookups = counters['thumbnail_cache_hits'] + counters['thumbnail_cache_misses']
+
+    response = jsonify({
+        'library': library,
+        'warmup': {
+            'index_ready': bool(library and library['indexed_at']),
+            'duplicate_detection': DUPLICATE_DETECTION,
+            'images_hashed': hashed,
+            'images_to_hash': hash_total,
+        },
+        'worker': dict(
+            counters,
+            pid=os.getpid(),
+            uptime=round(time.time() - WORKER_STARTED, 1),
+            thumbnail_cache_hit_rate=round(counters['thumbnail_cache_hits'] / lookups, 3) if lookups else None,
+            thumbnails_queued=queued,
+            thumbnails_running=running,
+            generation_slots=GENERATION_MAX_JOBS
+        )
     })
+    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    return response
 
 @app.route('/api/check-changes')
 @app.route('/api/check-changes/<path:subfolder>')
@@ -542,20 +2673,37 @@ def check_changes(subfolder=''):
         # Get modification times of all files and subdirectories
         latest_mtime = dir_mtime
         item_count = 0
+        folder = subfolder.strip('/')
+        subfolders = []
         
-        for item in os.listdir(current_path):
-            item_path = os.path.join(current_path, item)
-            try:
-                item_mtime = os.path.getmtime(item_path)
-                latest_mtime = max(latest_mtime, item_mtime)
-                item_count += 1
-            except (OSError, PermissionError):
-                continue
+        with os.scandir(current_path) as entries:
+            for entry in entries:
+                try:
+                    item_mtime = entry.stat().st_mtime
+                    latest_mtime = max(latest_mtime, item_mtime)
+                    item_count += 1
+                    if entry.is_dir() and not entry.name.startswith('.'):
+                        subfolders.append(f"{folder}/{entry.name}" if folder else entry.name)
+                except (OSError, PermissionError):
+                    continue
+        
+        # Keep the index current for this folder and its direct subfolders
+        # (only those whose mtime changed are re-listed); deeper changes
+        # reach subtree_modified through the index's rolled-up totals
+        library_index.refresh_folders([folder] + subfolders)
+        try:
+            stats = library_index.folder_stats([folder]).get(folder)
+        except sqlite3.Error as e:
+            print(f"Warning: Could not read folder statistics: {e}")
+            stats = None
         
         response = jsonify({
             'last_modified': latest_mtime,
             'item_count': item_count,
-            'folder': subfolder
+            'folder': subfolder,
+            # None until the index has reached the folder
+            'subtree_modified': stats['newest'] if stats else None,
+            'stats': stats
         })
         
         # Add no-cache headers to ensure fresh data
@@ -572,66 +2720,176 @@ def check_changes(subfolder=''):
         error_response.headers['Expires'] = '0'
         return error_response, 403
 
-@app.route('/api/delete/<path:filepath>', methods=['DELETE'])
-@login_required
-def delete_file(filepath):
-    """API endpoint to delete a file (images or videos only)"""
+def check_deletable(filepath):
+    """
+    Validate a relative path for deletion
+
+    Returns:
+        tuple: (full_path, relative_path, None, None) when the file may be deleted,
+        otherwise (None, None, error message, HTTP status)
+    """
+    if not isinstance(filepath, str) or not filepath:
+        return None, None, 'Invalid path', 400
+
+    full_path = os.path.normpath(os.path.join(IMAGES_FOLDER, filepath))
+
+    # Security check - ensure path is within images folder
+    if not full_path.startswith(IMAGES_FOLDER.rstrip(os.sep) + os.sep):
+        return None, None, 'Access denied', 403
+
+    # Check if file exists
+    if not os.path.exists(full_path):
+        return None, None, 'File not found', 404
+
+    # Check if it's a file (not a directory)
+    if not os.path.isfile(full_path):
+        return None, None, 'Cannot delete directories', 400
+
+    # Check if it's a media file
+    if not is_media_file(os.path.basename(full_path)):
+        return None, None, 'Can only delete media files', 400
+
+    relative_path = os.path.relpath(full_path, IMAGES_FOLDER).replace(os.sep, '/')
+    return full_path, relative_path, None, None
+
+def invalidate_cached_files(deleted_files):
+    """
+    Remove thumbnails, folder previews, metadata and preview strips of deleted files
+
+    Args:
+        deleted_files: list of (relative_path, filesize) tuples
+
+    The cache folder is listed once for the whole batch. Folder previews are
+    cached under the folder's path with the size of the file they show, and
+    come from files up to two levels deeper, so those ancestors are cleared too.
+    """
+    if not deleted_files:
+        return
+
     try:
-        # Get the safe path
-        safe_path = get_safe_path('')
-        full_path = os.path.join(safe_path, filepath)
+        cache_sizes = [int(item) for item in os.listdir(CACHE_FOLDER) if item.isdigit()]
+    except OSError:
+        cache_sizes = []
+
+    for relative_path, filesize in deleted_files:
+        cache_keys = [relative_path]
+        folder = os.path.dirname(relative_path)
+        for _ in range(3):
+            if not folder:
+                break
+            cache_keys.append(folder)
+            folder = os.path.dirname(folder)
+
+        cache_files = [os.path.join(CACHE_FOLDER, str(size), get_cache_filename(key, filesize, size))
+                       for size in cache_sizes for key in cache_keys]
+        cache_files.append(os.path.join(METADATA_FOLDER, get_metadata_filename(relative_path, filesize)))
+        strip_base = os.path.join(PREVIEW_STRIP_FOLDER, get_preview_strip_filename(relative_path, filesize))
+        cache_files.extend([strip_base + '.json', strip_base + '.jpg'])
+
+        for cache_file in cache_files:
+            try:
+                os.remove(cache_file)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Warning: Could not clean up cache for {relative_path}: {e}")
 
-        # Security check - ensure path is within images folder
-        if not full_path.startswith(IMAGES_FOLDER):
-            return jsonify({'error': 'Access denied'}), 403
+def delete_media_files(filepaths):
+    """
+    Delete media files and invalidate their cached data in one pass
 
-        # Check if file exists
-        if not os.path.exists(full_path):
-            return jsonify({'error': 'File not found'}), 404
+    Returns:
+        list of per-path result dicts with 'path' and 'success', plus
+        'error' and 'status' for paths that could not be deleted
+    """
+    # Validate the whole batch before anything is removed
+    checked = [(filepath,) + check_deletable(filepath) for filepath in filepaths]
 
-        # Check if it's a file (not a directory)
-        if not os.path.isfile(full_path):
-            return jsonify({'error': 'Cannot delete directories'}), 400
+    results = []
+    deleted_files = []
 
-        # Check if it's a media file
-        filename = os.path.basename(full_path)
-        if not is_media_file(filename):
-            return jsonify({'error': 'Can only delete media files'}), 400
+    for filepath, full_path, relative_path, error, status in checked:
+        if error:
+            results.append({'path': filepath, 'success': False, 'error': error, 'status': status})
+            continue
 
-        # Delete cached thumbnails for this file
         try:
             filesize = os.path.getsize(full_path)
-            # Check all cache size directories
-            if os.path.exists(CACHE_FOLDER):
-                for cache_size_dir in os.listdir(CACHE_FOLDER):
-                    cache_dir_path = os.path.join(CACHE_FOLDER, cache_size_dir)
-                    if os.path.isdir(cache_dir_path):
-                        try:
-                            size = int(cache_size_dir)
-                            cache_filename = get_cache_filename(filepath, filesize, size)
-                            cache_file_path = os.path.join(cache_dir_path, cache_filename)
-                            if os.path.exists(cache_file_path):
-                                os.remove(cache_file_path)
-                        except (ValueError, OSError):
-                            continue
-        except Exception as e:
-            print(f"Warning: Could not clean up cache for {filepath}: {e}")
+            os.remove(full_path)
+        except FileNotFoundError:
+            # Removed meanwhile, or listed twice under different spellings
+            results.append({'path': filepath, 'success': False, 'error': 'File not found', 'status': 404})
+            continue
+        except PermissionError:
+            results.append({'path': filepath, 'success': False, 'error': 'Permission denied', 'status': 403})
+            continue
+        except OSError as e:
+            print(f"Error deleting file {filepath}: {e}")
+            results.append({'path': filepath, 'success': False, 'error': 'Failed to delete file', 'status': 500})
+            continue
+
+        deleted_files.append((relative_path, filesize))
+        results.append({'path': filepath, 'success': True})
+
+    invalidate_cached_files(deleted_files)
+
+    # Each affected folder is re-indexed once, however many files it lost
+    for folder in sorted({os.path.dirname(relative_path) for relative_path, _ in deleted_files}):
+        library_index.refresh_folder(folder)
+
+    return results
 
-        # Delete the actual file
-        os.remove(full_path)
+@app.route('/api/delete/<path:filepath>', methods=['DELETE'])
+@login_required
+def delete_file(filepath):
+    """API endpoint to delete a file (images or videos only)"""
+    try:
+        result = delete_media_files([filepath])[0]
+        if not result['success']:
+            return jsonify({'error': result['error']}), result['status']
 
         return jsonify({
             'success': True,
-            'message': f'File {filename} deleted successfully',
+            'message': f'File {os.path.basename(filepath)} deleted successfully',
             'filepath': filepath
         })
 
-    except PermissionError:
-        return jsonify({'error': 'Permission denied'}), 403
     except Exception as e:
         print(f"Error deleting file {filepath}: {e}")
         return jsonify({'error': 'Failed to delete file'}), 500
 
+@app.route('/api/batch/delete', methods=['POST'])
+@login_required
+def batch_delete():
+    """
+    API endpoint to delete many files (images or videos only) in one request
+
+    Expects JSON {"paths": [...]} and returns a result per path, so the
+    client can update the gallery once for the whole batch.
+    """
+    data = request.get_json(silent=True) or {}
+    paths = data.get('paths')
+    if not isinstance(paths, list) or not paths:
+        return jsonify({'error': 'Expected a non-empty list of paths'}), 400
+    if len(paths) > BATCH_DELETE_LIMIT:
+        return jsonify({'error': f'At most {BATCH_DELETE_LIMIT} paths per request'}), 400
+
+    # Ignore repeated paths so they don't show up as "not found"
+    unique_paths = list(dict.fromkeys(path for path in paths if isinstance(path, str)))
+
+    try:
+        results = delete_media_files(unique_paths)
+    except Exception as e:
+        print(f"Error in batch delete: {e}")
+        return jsonify({'error': 'Failed to delete files'}), 500
+
+    deleted = sum(1 for result in results if result['success'])
+    return jsonify({
+        'results': results,
+        'deleted': deleted,
+        'failed': len(results) - deleted
+    })
+
 if __name__ == '__main__':
     # Create images directory if it doesn't exist
     os.makedirs(IMAGES_FOLDER, exist_ok=True)
@@ -13,9 +13,11 @@ class GalleryConfig {
         // Current state
         this.currentSize = 3;
         this.currentFolder = '';
+        this.sortOrder = 'name'; // 'name', 'taken' (oldest first) or '-taken' (newest first)
         this.allImages = []; // Store all image data for slideshow
         this.lastModified = null; // Track last modification time for change detection
         this.itemCount = null; // Track item count for change detection
+        this.subtreeModified = null; // Newest change anywhere below, once the server has indexed the folder
 
         // Initialize current folder from URL
         this.currentFolder = this.getCurrentFolder();
@@ -32,6 +34,7 @@ class GalleryConfig {
     resetChangeDetection() {
         this.lastModified = null;
         this.itemCount = null;
+        this.subtreeModified = null;
     }
 }
 
@@ -0,0 +1,192 @@
+// Duplicate finder view: groups of near-identical images with bulk delete
+class DuplicatesView {
+    constructor() {
+        this.container = document.getElementById('duplicateGroups');
+        this.status = document.getElementById('duplicateStatus');
+        this.distanceSelect = document.getElementById('distanceSelect');
+        this.deleteButton = document.getElementById('deleteSelectedBtn');
+        this.moreButton = document.getElementById('loadMoreBtn');
+
+        this.thumbnailSize = 150;
+        this.page = 1;
+        this.pendingPaths = new Set();
+        this.pollTimer = null;
+        this.pollInterval = 1000;
+    }
+
+    init() {
+        if (this.distanceSelect) {
+            this.distanceSelect.addEventListener('change', () => this.load());
+        }
+        if (this.deleteButton) {
+            this.deleteButton.addEventListener('click', () => this.deleteSelected());
+        }
+        if (this.moreButton) {
+            this.moreButton.addEventListener('click', () => this.load(this.page + 1));
+        }
+        if (this.container) {
+            this.container.addEventListener('change', () => this.updateDeleteButton());
+        }
+        this.load();
+    }
+
+    async load(page = 1) {
+        const distance = this.distanceSelect ? this.distanceSelect.value : '';
+        const query = distance !== '' ? `distance=${distance}&page=${page}` : `page=${page}`;
+
+        try {
+            const response = await fetch(`/api/duplicates?${query}`);
+            const data = await response.json();
+            if (!response.ok) {
+                throw new Error(data.error || `HTTP error! status: ${response.status}`);
+            }
+
+            this.page = page;
+            const html = data.groups.map(group => this.renderGroup(group)).join('');
+            if (page === 1) {
+                this.pendingPaths.clear();
+                this.container.innerHTML = html || '<div class="no-images">No duplicates found</div>';
+            } else {
+                this.container.insertAdjacentHTML('beforeend', html);
+            }
+
+            data.groups.forEach(group => group.forEach(file => this.pendingPaths.add(file.path)));
+            this.status.textContent = this.describe(data);
+            if (this.moreButton) {
+                this.moreButton.style.display = page * data.per_page < data.total_groups ? '' : 'none';
+            }
+            this.updateDeleteButton();
+            await this.pollThumbnails();
+        } catch (error) {
+            console.error('Error loading duplicates:', error);
+            this.container.innerHTML = `<div class="no-images">Error loading duplicates: ${error.message}</div>`;
+        }
+    }
+
+    describe(data) {
+        let text = `${data.total_groups} groups, ${data.redundant_files} files could be removed.`;
+        if (!data.enabled) {
+            text += ' Background hashing is disabled (DUPLICATE_DETECTION).';
+        } else if (data.hashed < data.images) {
+            text += ` Still hashing: ${data.hashed} of ${data.images} images checked so far.`;
+        }
+        return text;
+    }
+
+    renderGroup(group) {
+        return `
+            <div class="duplicate-group">
+                <div class="duplicate-group-header">${group.length} similar images</div>
+                <div class="duplicate-files">
+                    ${group.map(file => this.renderFile(file)).join('')}
+                </div>
+            </div>
+        `;
+    }
+
+    renderFile(file) {
+        const dataPath = encodeURIComponent(file.path);
+        const sizeKb = Math.round(file.size / 1024);
+        return `
+            <div class="duplicate-file pending" data-path="${dataPath}">
+                <a href="/images/${encodeURI(file.path)}" target="_blank" class="duplicate-thumbnail">
+                    <div class="thumbnail-placeholder" style="aspect-ratio: 1;"></div>
+                </a>
+                <label class="duplicate-file-info">
+                    <input type="checkbox" class="duplicate-select" value="${dataPath}">
+                    <span>${file.filename}</span>
+                </label>
+                <div class="duplicate-file-meta">${file.folder || 'Home'} &middot; ${sizeKb} KB</div>
+            </div>
+        `;
+    }
+
+    async pollThumbnails() {
+        clearTimeout(this.pollTimer);
+        this.pollTimer = null;
+        if (this.pendingPaths.size === 0) {
+            return;
+        }
+
+        const paths = Array.from(this.pendingPaths).slice(0, 500);
+        try {
+            const response = await fetch(`/api/thumbnails/poll/${this.thumbnailSize}`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ paths, visible: paths })
+            });
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+
+            const data = await response.json();
+            data.ready.forEach(update => this.showThumbnail(update));
+        } catch (error) {
+            console.warn('Error loading duplicate thumbnails:', error);
+        }
+
+        if (this.pendingPaths.size > 0) {
+            this.pollTimer = setTimeout(() => this.pollThumbnails(), this.pollInterval);
+        }
+    }
+
+    showThumbnail(update) {
+        this.pendingPaths.delete(update.path);
+        const dataPath = encodeURIComponent(update.path);
+        this.container.querySelectorAll('.duplicate-file').forEach(element => {
+            if (element.dataset.path !== dataPath) {
+                return;
+            }
+            element.classList.remove('pending');
+            if (update.thumbnail) {
+                element.querySelector('.duplicate-thumbnail').innerHTML =
+                    `<img src="${update.thumbnail}" alt="" loading="lazy">`;
+            }
+        });
+    }
+
+    getSelectedPaths() {
+        return Array.from(this.container.querySelectorAll('.duplicate-select:checked'))
+            .map(input => decodeURIComponent(input.value));
+    }
+
+    updateDeleteButton() {
+        if (!this.deleteButton) {
+            return;
+        }
+        const count = this.getSelectedPaths().length;
+        this.deleteButton.disabled = count === 0;
+        this.deleteButton.textContent = count ? `Delete selected (${count})` : 'Delete selected';
+    }
+
+    async deleteSelected() {
+        const paths = this.getSelectedPaths();
+        if (paths.length === 0 || !confirm(`Delete ${paths.length} files? This cannot be undone.`)) {
+            return;
+        }
+
+        try {
+            const response = await fetch('/api/batch/delete', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ paths })
+            });
+            const data = await response.json();
+            if (!response.ok) {
+                throw new Error(data.error || `HTTP error! status: ${response.status}`);
+            }
+            if (data.failed > 0) {
+                alert(`${data.failed} of ${paths.length} files could not be deleted.`);
+            }
+        } catch (error) {
+            console.error('Error deleting duplicates:', error);
+            alert(`Error deleting files: ${error.message}`);
+        }
+
+        await this.load();
+    }
+}
+
+// Initialize Duplicates View
+window.duplicatesView = new DuplicatesView();
+document.addEventListener('DOMContentLoaded', () => window.duplicatesView.init());
@@ -8,6 +8,9 @@ class FullscreenManager {
         this.individualViewActive = false;
         this.currentIndividualImageIndex = 0;
 
+        // Paths marked in individual view, deleted together in one batch
+        this.markedPaths = new Set();
+
         // Touch/swipe handling
         this.touchStartX = null;
         this.touchStartY = null;
@@ -146,6 +149,7 @@ class FullscreenManager {
                 this.currentIndividualImageIndex = 0; // Last resort fallback
             }
         }
+        this.updateMarkIndicator();
     }
 
     showVideo(videoSrc, videoName) {
@@ -172,6 +176,8 @@ class FullscreenManager {
             }
         }
         
+        this.updateMarkIndicator();
+
         // Optional: Auto-play video
         this.fullscreenVideo.load();
         this.fullscreenVideo.play();
@@ -189,20 +195,9 @@ class FullscreenManager {
         } while ((this.config.allImages[nextIndex].type !== 'image' && this.config.allImages[nextIndex].type !== 'video') && attempts < this.config.allImages.length);
         
         const nextItem = this.config.allImages[nextIndex];
-        if (nextItem && nextItem.type === 'image') {
-            this.currentIndividualImageIndex = nextIndex;
-            this.fullscreenVideo.style.display = 'none';
-            this.fullscreenVideo.pause();
-            this.fullscreenImage.style.display = 'block';
-            this.fullscreenImage.src = `/images/${encodeURIComponent(nextItem.path)}`;
-            this.fullscreenImage.alt = nextItem.filename;
-        } else if (nextItem && nextItem.type === 'video') {
+        if (nextItem && (nextItem.type === 'image' || nextItem.type === 'video')) {
             this.currentIndividualImageIndex = nextIndex;
-            this.fullscreenImage.style.display = 'none';
-            this.fullscreenVideo.style.display = 'block';
-            this.fullscreenVideo.src = `/videos/${encodeURIComponent(nextItem.path)}`;
-            this.fullscreenVideo.load();
-            this.fullscreenVideo.play();
+            this.displayMediaItem(nextItem);
         }
     }
 
@@ -218,21 +213,52 @@ class FullscreenManager {
         } while ((this.config.allImages[prevIndex].type !== 'image' && this.config.allImages[prevIndex].type !== 'video') && attempts < this.config.allImages.length);
         
         const prevItem = this.config.allImages[prevIndex];
-        if (prevItem && prevItem.type === 'image') {
+        if (prevItem && (prevItem.type === 'image' || prevItem.type === 'video')) {
             this.currentIndividualImageIndex = prevIndex;
+            this.displayMediaItem(prevItem);
+        }
+    }
+
+    displayMediaItem(item) {
+        if (item.type === 'image') {
             this.fullscreenVideo.style.display = 'none';
             this.fullscreenVideo.pause();
             this.fullscreenImage.style.display = 'block';
-            this.fullscreenImage.src = `/images/${encodeURIComponent(prevItem.path)}`;
-            this.fullscreenImage.alt = prevItem.filename;
-        } else if (prevItem && prevItem.type === 'video') {
-            this.currentIndividualImageIndex = prevIndex;
+            this.fullscreenImage.src = `/images/${encodeURIComponent(item.path)}`;
+            this.fullscreenImage.alt = item.filename;
+        } else {
             this.fullscreenImage.style.display = 'none';
             this.fullscreenVideo.style.display = 'block';
-            this.fullscreenVideo.src = `/videos/${encodeURIComponent(prevItem.path)}`;
+            this.fullscreenVideo.src = `/videos/${encodeURIComponent(item.path)}`;
             this.fullscreenVideo.load();
             this.fullscreenVideo.play();
         }
+        this.updateMarkIndicator();
+    }
+
+    currentMediaItem() {
+        const item = this.config.allImages[this.currentIndividualImageIndex];
+        return item && (item.type === 'image' || item.type === 'video') ? item : null;
+    }
+
+    toggleMarkCurrentMedia() {
+        const item = this.currentMediaItem();
+        if (!item) {
+            return;
+        }
+        if (this.markedPaths.has(item.path)) {
+            this.markedPaths.delete(item.path);
+        } else {
+            this.markedPaths.add(item.path);
+        }
+        this.updateMarkIndicator();
+    }
+
+    updateMarkIndicator() {
+        const item = this.currentMediaItem();
+        const marked = Boolean(item) && this.markedPaths.has(item.path);
+        this.fullscreenImage.classList.toggle('marked-for-delete', marked);
+        this.fullscreenVideo.classList.toggle('marked-for-delete', marked);
     }
 
     // Touch/Swipe handling methods
@@ -317,6 +343,8 @@ class FullscreenManager {
             this.fullscreenOverlay.style.display = 'none';
             document.body.style.overflow = '';
             this.individualViewActive = false; // Reset individual view state
+            this.markedPaths.clear();
+            this.updateMarkIndicator();
 
             // Stop video playback when hiding
             if (this.fullscreenVideo.style.display !== 'none') {
@@ -332,83 +360,56 @@ class FullscreenManager {
     }
 
     async deleteCurrentMedia() {
-        // Get the current media item
-        const currentItem = this.config.allImages[this.currentIndividualImageIndex];
-        if (!currentItem || (currentItem.type !== 'image' && currentItem.type !== 'video')) {
+        const currentItem = this.currentMediaItem();
+        if (!currentItem || !window.galleryLoader) {
             return;
         }
 
-        const filename = currentItem.filename;
-        const filepath = currentItem.path;
-
-        // Show confirmation dialog
-        const confirmed = confirm(`Are you sure you want to delete "${filename}"?\n\nThis action cannot be undone.`);
-        if (!confirmed) {
+        // Marked items are deleted together; otherwise just the one on screen
+        const paths = this.markedPaths.size > 0 ? Array.from(this.markedPaths) : [currentItem.path];
+        const message = paths.length === 1 ?
+            `Are you sure you want to delete "${paths[0].split('/').pop()}"?\n\nThis action cannot be undone.` :
+            `Are you sure you want to delete ${paths.length} marked files?\n\nThis action cannot be undone.`;
+        if (!confirm(message)) {
             return;
         }
 
+        // Carry on with the next item that isn't being deleted
+        const items = this.config.allImages;
+        let nextPath = null;
+        for (let offset = 1; offset < items.length; offset++) {
+            const item = items[(this.currentIndividualImageIndex + offset) % items.length];
+            if ((item.type === 'image' || item.type === 'video') && !paths.includes(item.path)) {
+                nextPath = item.path;
+                break;
+            }
+        }
+
         try {
-            // Call the delete API
-            const response = await fetch(`/api/delete/${encodeURIComponent(filepath)}`, {
-                method: 'DELETE',
-                headers: {
-                    'Content-Type': 'application/json'
-                }
-            });
+            // One request for the batch; the gallery reloads once afterwards
+            const data = await window.galleryLoader.deleteFiles(paths);
+            this.markedPaths.clear();
 
-            const result = await response.json();
-
-            if (response.ok && result.success) {
-                // Remove from the allImages array
-                this.config.allImages.splice(this.currentIndividualImageIndex, 1);
-
-                // Show success message briefly
-                alert(`"${filename}" has been deleted.`);
-
-                // If there are more media items, show the next one
-                if (this.config.allImages.length > 0) {
-                    // Adjust index if we're at the end
-                    if (this.currentIndividualImageIndex >= this.config.allImages.length) {
-                        this.currentIndividualImageIndex = this.config.allImages.length - 1;
-                    }
-
-                    // Show next media (or previous if we were at the end)
-                    const nextItem = this.config.allImages[this.currentIndividualImageIndex];
-                    if (nextItem && nextItem.type === 'image') {
-                        this.fullscreenVideo.style.display = 'none';
-                        this.fullscreenVideo.pause();
-                        this.fullscreenImage.style.display = 'block';
-                        this.fullscreenImage.src = `/images/${encodeURIComponent(nextItem.path)}`;
-                        this.fullscreenImage.alt = nextItem.filename;
-                    } else if (nextItem && nextItem.type === 'video') {
-                        this.fullscreenImage.style.display = 'none';
-                        this.fullscreenVideo.style.display = 'block';
-                        this.fullscreenVideo.src = `/videos/${encodeURIComponent(nextItem.path)}`;
-                        this.fullscreenVideo.load();
-                        this.fullscreenVideo.play();
-                    } else {
-                        // No more media items, close fullscreen
-                        this.hideFullscreen();
-                    }
-
-                    // Reload the gallery to update thumbnails
-                    if (window.galleryLoader) {
-                        window.galleryLoader.loadThumbnails();
-                    }
-                } else {
-                    // No more media items, close fullscreen and reload gallery
-                    this.hideFullscreen();
-                    if (window.galleryLoader) {
-                        window.galleryLoader.loadThumbnails();
-                    }
-                }
-            } else {
-                // Show error message
-                alert(`Failed to delete "${filename}": ${result.error || 'Unknown error'}`);
+            const failed = data.results.filter(result => !result.success);
+            if (failed.length > 0) {
+                alert(`Failed to delete ${failed.length} of ${paths.length} files: ${failed[0].error || 'Unknown error'}`);
+            }
+            if (data.deleted === 0) {
+                this.updateMarkIndicator();
+                return;
+            }
+
+            const nextIndex = nextPath === null ? -1 : this.config.allImages.findIndex(item => item.path === nextPath);
+            if (nextIndex === -1) {
+                // No more media items, close fullscreen
+                this.hideFullscreen();
+                return;
             }
+            this.currentIndividualImageIndex = nextIndex;
+            this.displayMediaItem(this.config.allImages[nextIndex]);
         } catch (error) {
-            console.error('Error deleting file:', error);
-            alert(`Failed to delete "${filename}": ${error.message}`);
+            console.error('Error deleting files:', error);
+            alert(`Failed to delete: ${error.message}`);
         }
     }
 
@@ -451,6 +452,13 @@ class FullscreenManager {
                     case 'ArrowRight':
                         this.showNextMedia();
                         break;
+                    case 'm':
+                    case 'M':
+                        // Mark for deletion, e.g. to clear out a burst in one go
+                        if (!this.isMobileDevice()) {
+                            this.toggleMarkCurrentMedia();
+                        }
+                        break;
                     case 'Delete':
                     case 'Backspace':
                         // Only allow delete on desktop (non-mobile devices)
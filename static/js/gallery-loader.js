@@ -3,6 +3,18 @@ class GalleryLoader {
     constructor(config) {
         this.config = config;
         this.gallery = document.getElementById('gallery');
+        
+        // Items whose thumbnails are still being generated, keyed by path
+        this.pendingItems = new Map();
+        this.pendingTimer = null;
+        this.pollInterval = 1000;
+        this.loadId = 0;
+
+        // Hover preview strips of videos, keyed by path (manifest or null)
+        this.previewStrips = new Map();
+
+        // Newest modification time seen in each folder's subtree, keyed by path
+        this.folderNewest = new Map();
     }
 
     init() {
@@ -18,6 +30,10 @@ class GalleryLoader {
             window.uiControls.showLoading();
         }
         
+        // Forget thumbnails pending for a previous folder or size
+        const loadId = ++this.loadId;
+        this.stopPendingPolling();
+        
         try {
             const size = this.config.sizeMap[this.config.currentSize].pixels;
             let apiUrl = `/api/thumbnails/${size}`;
@@ -26,6 +42,13 @@ class GalleryLoader {
                 apiUrl += `/${this.config.currentFolder}`;
             }
             
+            // Only the thumbnails that fit on screen are generated up front
+            apiUrl += `?visible=${this.estimateVisibleCount(size)}`;
+            
+            if (this.config.sortOrder && this.config.sortOrder !== 'name') {
+                apiUrl += `&sort=${encodeURIComponent(this.config.sortOrder)}`;
+            }
+            
             const response = await fetch(apiUrl);
             
             if (!response.ok) {
@@ -34,6 +57,11 @@ class GalleryLoader {
             
             const data = await response.json();
             
+            // A newer load (folder or size change) has started meanwhile
+            if (loadId !== this.loadId) {
+                return;
+            }
+            
             // Filter the response into folders, images, and videos
             const folders = data.filter(item => item.type === 'folder');
             const images = data.filter(item => item.type === 'image');
@@ -51,86 +79,31 @@ class GalleryLoader {
             
             let galleryHTML = '';
             
-            // Add folders first
+            // Folders first, then images, then videos
             folders.forEach(folder => {
-                const folderSize = this.config.sizeMap[this.config.currentSize].pixels;
-
-                if (folder.preview) {
-                    // Folder with preview thumbnail - use image with overlay
-                    galleryHTML += `
-                        <div class="folder-item folder-with-preview" style="width: ${folderSize}px;" onclick="navigateToFolder('${folder.path}')">
-                            <div class="folder-preview-container">
-                                <img src="${folder.preview}" alt="${folder.name}" loading="lazy" class="folder-preview-image">
-                                <div class="folder-frame-overlay">
-                                    <svg width="32" height="32" viewBox="0 0 24 24" fill="currentColor" class="folder-overlay-icon">
-                                        <path d="M10 4H4c-1.11 0-2 .89-2 2v12c0 1.11.89 2 2 2h16c1.11 0 2-.89 2-2V8c0-1.11-.89-2-2-2h-8l-2-2z"/>
-                                    </svg>
-                                </div>
-                            </div>
-                            <div class="folder-name">${folder.name}</div>
-                        </div>
-                    `;
-                } else {
-                    // Folder without preview - use classic icon
-                    galleryHTML += `
-                        <div class="folder-item" style="width: ${folderSize}px;" onclick="navigateToFolder('${folder.path}')">
-                            <div class="folder-icon">
-                                <svg width="48" height="48" viewBox="0 0 24 24" fill="currentColor">
-                                    <path d="M10 4H4c-1.11 0-2 .89-2 2v12c0 1.11.89 2 2 2h16c1.11 0 2-.89 2-2V8c0-1.11-.89-2-2-2h-8l-2-2z"/>
-                                </svg>
-                            </div>
-                            <div class="folder-name">${folder.name}</div>
-                        </div>
-                    `;
-                }
+                // Kept on the item so re-rendering a pending tile keeps the marker
+                folder.updated = this.isFolderUpdated(folder);
+                galleryHTML += this.renderFolder(folder);
             });
+            this.rememberFolderStats(folders);
             
-            // Add images
-            this.config.allImages.forEach((image, index) => {
-                galleryHTML += `
-                    <div class="image-item" onclick="showFullscreen('/images/${encodeURIComponent(image.path)}')">
-                        <img src="${image.thumbnail}" alt="${image.filename}" loading="lazy">
-                        <div class="image-name">${image.filename}</div>
-                    </div>
-                `;
+            this.config.allImages.forEach(image => {
+                galleryHTML += this.renderImage(image);
             });
             
-            // Add videos
-            videos.forEach((video, index) => {
-                if (video.thumbnail) {
-                    // Video has a thumbnail image
-                    galleryHTML += `
-                        <div class="video-item image-style" onclick="showVideo('/videos/${encodeURIComponent(video.path)}', '${video.filename}')">
-                            <div class="video-thumbnail-container">
-                                <img src="${video.thumbnail}" alt="${video.filename}" loading="lazy">
-                                <div class="video-play-overlay">
-                                    <svg width="32" height="32" viewBox="0 0 24 24" fill="rgba(255,255,255,0.9)">
-                                        <path d="M8,5.14V19.14L19,12.14L8,5.14Z" />
-                                    </svg>
-                                </div>
-                            </div>
-                            <div class="video-name">${video.filename}</div>
-                        </div>
-                    `;
-                } else {
-                    // Fallback to icon if no thumbnail
-                    const videoSize = this.config.sizeMap[this.config.currentSize].pixels;
-                    galleryHTML += `
-                        <div class="video-item" style="width: ${videoSize}px;" onclick="showVideo('/videos/${encodeURIComponent(video.path)}', '${video.filename}')">
-                            <div class="video-icon">
-                                <svg width="48" height="48" viewBox="0 0 24 24" fill="currentColor">
-                                    <path d="M8,5.14V19.14L19,12.14L8,5.14Z" />
-                                </svg>
-                            </div>
-                            <div class="video-name">${video.filename}</div>
-                        </div>
-                    `;
-                }
+            videos.forEach(video => {
+                galleryHTML += this.renderVideo(video);
             });
             
             this.gallery.innerHTML = galleryHTML;
             this.dispatchImagesLoaded();
             
+            // Thumbnails that weren't ready yet are collected by polling
+            data.filter(item => item.pending).forEach(item => {
+                this.pendingItems.set(item.path, item);
+            });
+            this.schedulePendingPoll();
+            
             // Initialize change detection after successful load (but don't await it)
             if (this.config.lastModified === null || this.config.itemCount === null) {
                 this.checkForChanges();
@@ -144,6 +117,324 @@ class GalleryLoader {
         }
     }
 
+    isFolderUpdated(folder) {
+        // Something inside changed since the folder was last shown
+        const previous = this.folderNewest.get(folder.path);
+        return Boolean(folder.stats) && previous !== undefined && folder.stats.newest > previous;
+    }
+
+    rememberFolderStats(folders) {
+        folders.forEach(folder => {
+            if (folder.stats) {
+                this.folderNewest.set(folder.path, folder.stats.newest);
+            }
+        });
+    }
+
+    describeFolderStats(stats) {
+        if (!stats) {
+            return '';
+        }
+        const parts = [];
+        if (stats.images) {
+            parts.push(`${stats.images} ${stats.images === 1 ? 'photo' : 'photos'}`);
+        }
+        if (stats.videos) {
+            parts.push(`${stats.videos} ${stats.videos === 1 ? 'video' : 'videos'}`);
+        }
+        return parts.length ? parts.join(' &middot; ') : 'Empty';
+    }
+
+    renderFolder(folder) {
+        const folderSize = this.config.sizeMap[this.config.currentSize].pixels;
+        const pendingClass = folder.pending ? ' pending' : '';
+        const updatedClass = folder.updated ? ' updated' : '';
+        const dataPath = encodeURIComponent(folder.path);
+        const statsHTML = folder.stats ?
+            `<div class="folder-stats">${this.describeFolderStats(folder.stats)}</div>` : '';
+
+        if (folder.preview) {
+            // Folder with preview thumbnail - use image with overlay
+            return `
+                <div class="folder-item folder-with-preview${updatedClass}" data-path="${dataPath}" style="width: ${folderSize}px;" onclick="navigateToFolder('${folder.path}')">
+                    <div class="folder-preview-container">
+                        <img src="${folder.preview}" alt="${folder.name}" loading="lazy" class="folder-preview-image">
+                        <div class="folder-frame-overlay">
+                            <svg width="32" height="32" viewBox="0 0 24 24" fill="currentColor" class="folder-overlay-icon">
+                                <path d="M10 4H4c-1.11 0-2 .89-2 2v12c0 1.11.89 2 2 2h16c1.11 0 2-.89 2-2V8c0-1.11-.89-2-2-2h-8l-2-2z"/>
+                            </svg>
+                        </div>
+                    </div>
+                    <div class="folder-name">${folder.name}</div>
+                    ${statsHTML}
+                </div>
+            `;
+        }
+
+        // Folder without preview - use classic icon
+        return `
+            <div class="folder-item${pendingClass}${updatedClass}" data-path="${dataPath}" style="width: ${folderSize}px;" onclick="navigateToFolder('${folder.path}')">
+                <div class="folder-icon">
+                    <svg width="48" height="48" viewBox="0 0 24 24" fill="currentColor">
+                        <path d="M10 4H4c-1.11 0-2 .89-2 2v12c0 1.11.89 2 2 2h16c1.11 0 2-.89 2-2V8c0-1.11-.89-2-2-2h-8l-2-2z"/>
+                    </svg>
+                </div>
+                <div class="folder-name">${folder.name}</div>
+                ${statsHTML}
+            </div>
+        `;
+    }
+
+    dimensionAttributes(item) {
+        // Lets the browser reserve the right amount of space before the image loads
+        return item.width && item.height ? ` width="${item.width}" height="${item.height}"` : '';
+    }
+
+    renderImage(image) {
+        const pendingClass = image.pending ? ' pending' : '';
+        const size = this.config.sizeMap[this.config.currentSize].pixels;
+        const placeholderStyle = image.width && image.height ?
+            `aspect-ratio: ${image.width} / ${image.height};` :
+            `height: ${size}px;`;
+        const content = image.thumbnail ?
+            `<img src="${image.thumbnail}" alt="${image.filename}" loading="lazy"${this.dimensionAttributes(image)}>` :
+            `<div class="thumbnail-placeholder" style="${placeholderStyle}"></div>`;
+
+        return `
+            <div class="image-item${pendingClass}" data-path="${encodeURIComponent(image.path)}" onclick="showFullscreen('/images/${encodeURIComponent(image.path)}')">
+                ${content}
+                <div class="image-name">${image.filename}</div>
+            </div>
+        `;
+    }
+
+    renderVideo(video) {
+        const pendingClass = video.pending ? ' pending' : '';
+        const dataPath = encodeURIComponent(video.path);
+
+        if (video.thumbnail) {
+            // Video has a thumbnail image
+            return `
+                <div class="video-item image-style" data-path="${dataPath}" onclick="showVideo('/videos/${encodeURIComponent(video.path)}', '${video.filename}')">
+                    <div class="video-thumbnail-container">
+                        <img src="${video.thumbnail}" alt="${video.filename}" loading="lazy"${this.dimensionAttributes(video)}>
+                        <div class="video-play-overlay">
+                            <svg width="32" height="32" viewBox="0 0 24 24" fill="rgba(255,255,255,0.9)">
+                                <path d="M8,5.14V19.14L19,12.14L8,5.14Z" />
+                            </svg>
+                        </div>
+                    </div>
+                    <div class="video-name">${video.filename}</div>
+                </div>
+            `;
+        }
+
+        // Fallback to icon if no thumbnail
+        const videoSize = this.config.sizeMap[this.config.currentSize].pixels;
+        return `
+            <div class="video-item${pendingClass}" data-path="${dataPath}" style="width: ${videoSize}px;" onclick="showVideo('/videos/${encodeURIComponent(video.path)}', '${video.filename}')">
+                <div class="video-icon">
+                    <svg width="48" height="48" viewBox="0 0 24 24" fill="currentColor">
+                        <path d="M8,5.14V19.14L19,12.14L8,5.14Z" />
+                    </svg>
+                </div>
+                <div class="video-name">${video.filename}</div>
+            </div>
+        `;
+    }
+
+    renderItem(item) {
+        if (item.type === 'folder') {
+            return this.renderFolder(item);
+        }
+        return item.type === 'video' ? this.renderVideo(item) : this.renderImage(item);
+    }
+
+    estimateVisibleCount(size) {
+        // Tiles per row times rows on screen, plus one extra row as a margin
+        const width = window.innerWidth || 1280;
+        const height = window.innerHeight || 800;
+        const tile = size + 40; // padding, gap and filename
+        const columns = Math.max(1, Math.floor(width / tile));
+        const rows = Math.ceil(height / tile) + 1;
+        return columns * rows;
+    }
+
+    getVisiblePendingPaths() {
+        if (!this.gallery.querySelectorAll) {
+            return [];
+        }
+
+        const viewportHeight = window.innerHeight || 0;
+        const visible = [];
+        this.gallery.querySelectorAll('.pending[data-path]').forEach(element => {
+            const rect = element.getBoundingClientRect();
+            if (rect.bottom >= 0 && rect.top <= viewportHeight) {
+                visible.push(decodeURIComponent(element.dataset.path));
+            }
+        });
+        return visible;
+    }
+
+    schedulePendingPoll(immediate = false) {
+        if (this.pendingTimer) {
+            clearTimeout(this.pendingTimer);
+            this.pendingTimer = null;
+        }
+        if (this.pendingItems.size === 0) {
+            return;
+        }
+        this.pendingTimer = setTimeout(() => this.pollPendingThumbnails(), immediate ? 150 : this.pollInterval);
+    }
+
+    stopPendingPolling() {
+        if (this.pendingTimer) {
+            clearTimeout(this.pendingTimer);
+            this.pendingTimer = null;
+        }
+        this.pendingItems.clear();
+    }
+
+    async pollPendingThumbnails() {
+        this.pendingTimer = null;
+        if (this.pendingItems.size === 0) {
+            return;
+        }
+
+        const loadId = this.loadId;
+        const size = this.config.sizeMap[this.config.currentSize].pixels;
+
+        try {
+            const response = await fetch(`/api/thumbnails/poll/${size}`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    paths: Array.from(this.pendingItems.keys()),
+                    visible: this.getVisiblePendingPaths()
+                })
+            });
+
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+
+            const data = await response.json();
+            if (loadId !== this.loadId) {
+                return;
+            }
+            data.ready.forEach(update => this.resolvePendingItem(update));
+        } catch (error) {
+            console.warn('Error polling pending thumbnails:', error);
+        }
+
+        if (loadId === this.loadId) {
+            this.schedulePendingPoll();
+        }
+    }
+
+    resolvePendingItem(update) {
+        const item = this.pendingItems.get(update.path);
+        if (!item) {
+            return;
+        }
+        this.pendingItems.delete(update.path);
+
+        // Items in allImages are the same objects, so the slideshow sees the update too
+        Object.assign(item, update);
+        delete item.pending;
+
+        if (!this.gallery.querySelectorAll) {
+            return;
+        }
+        const dataPath = encodeURIComponent(item.path);
+        this.gallery.querySelectorAll('[data-path]').forEach(element => {
+            if (element.dataset.path === dataPath) {
+                element.outerHTML = this.renderItem(item);
+            }
+        });
+    }
+
+    async deleteFiles(paths) {
+        // One request for the whole batch, then a single gallery refresh
+        const response = await fetch('/api/batch/delete', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ paths })
+        });
+
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || `HTTP error! status: ${response.status}`);
+        }
+
+        if (data.deleted > 0) {
+            await this.loadThumbnails();
+        }
+        return data;
+    }
+
+    getPreviewStrip(path) {
+        if (!this.previewStrips.has(path)) {
+            const request = fetch(`/api/preview-strip/${encodeURIComponent(path)}`)
+                .then(async response => {
+                    if (response.status === 202 || response.status === 503) {
+                        // Still being generated; ask again on a hover after Retry-After
+                        const retryAfter = parseInt(response.headers && response.headers.get('Retry-After'), 10) || 1;
+                        setTimeout(() => this.previewStrips.delete(path), retryAfter * 1000);
+                        return null;
+                    }
+                    return response.ok ? response.json() : null;
+                })
+                .catch(error => {
+                    console.warn('Error loading preview strip:', error);
+                    this.previewStrips.delete(path);
+                    return null;
+                });
+            this.previewStrips.set(path, request);
+        }
+        return this.previewStrips.get(path);
+    }
+
+    showPreviewFrame(container, strip, fraction) {
+        const index = Math.min(strip.frames - 1, Math.max(0, Math.floor(fraction * strip.frames)));
+        let preview = container.querySelector('.video-preview-frame');
+        if (!preview) {
+            preview = document.createElement('div');
+            preview.className = 'video-preview-frame';
+            preview.style.backgroundImage = `url(${strip.sprite})`;
+            preview.style.backgroundSize = `${strip.frames * 100}% 100%`;
+            // Keep the play button on top
+            container.insertBefore(preview, container.querySelector('.video-play-overlay'));
+        }
+
+        const position = strip.frames > 1 ? (index / (strip.frames - 1)) * 100 : 0;
+        preview.style.backgroundPosition = `${position}% 0`;
+    }
+
+    hidePreviewFrame(container) {
+        const preview = container.querySelector('.video-preview-frame');
+        if (preview) {
+            preview.remove();
+        }
+    }
+
+    async handlePreviewHover(event) {
+        const container = event.target.closest && event.target.closest('.video-thumbnail-container');
+        if (!container) {
+            return;
+        }
+
+        const item = container.closest('[data-path]');
+        const strip = await this.getPreviewStrip(decodeURIComponent(item.dataset.path));
+        // The pointer may have left while the strip was loading
+        if (!strip || !container.matches(':hover')) {
+            return;
+        }
+
+        const rect = container.getBoundingClientRect();
+        this.showPreviewFrame(container, strip, (event.clientX - rect.left) / rect.width);
+    }
+
     dispatchImagesLoaded() {
         window.dispatchEvent(new CustomEvent('imagesLoaded'));
     }
@@ -161,11 +452,13 @@ class GalleryLoader {
             }
             
             const data = await response.json();
+            const subtreeModified = data.subtree_modified || null;
             
             // On first load, just store the values
             if (this.config.lastModified === null || this.config.itemCount === null) {
                 this.config.lastModified = data.last_modified;
                 this.config.itemCount = data.item_count;
+                this.config.subtreeModified = subtreeModified;
                 console.log('Change detection initialized:', {
                     folder: this.config.currentFolder || 'root',
                     lastModified: new Date(this.config.lastModified * 1000).toISOString(),
@@ -174,9 +467,14 @@ class GalleryLoader {
                 return false;
             }
             
-            // Check if anything has changed
+            // Check if anything has changed; nested changes only count once the
+            // server has indexed the folder, so its first report isn't a change
+            const subtreeChanged = subtreeModified !== null && this.config.subtreeModified !== null &&
+                subtreeModified !== this.config.subtreeModified;
             const hasChanged = data.last_modified !== this.config.lastModified || 
-                             data.item_count !== this.config.itemCount;
+                             data.item_count !== this.config.itemCount ||
+                             subtreeChanged;
+            this.config.subtreeModified = subtreeModified;
             
             if (hasChanged) {
                 console.log('Folder changes detected:', {
@@ -211,10 +509,31 @@ class GalleryLoader {
             this.loadThumbnails();
         });
 
+        // Listen for sort order changes
+        window.addEventListener('sortChanged', () => {
+            this.loadThumbnails();
+        });
+
         // Listen for folder changes
         window.addEventListener('folderChanged', () => {
             this.loadThumbnails();
         });
+
+        // Tiles scrolled into view jump to the front of the generation queue
+        window.addEventListener('scroll', () => {
+            this.schedulePendingPoll(true);
+        });
+
+        // Scrub through videos by moving the pointer across their tiles
+        if (this.gallery && this.gallery.addEventListener) {
+            this.gallery.addEventListener('mousemove', event => this.handlePreviewHover(event));
+            this.gallery.addEventListener('mouseout', event => {
+                const container = event.target.closest && event.target.closest('.video-thumbnail-container');
+                if (container && !container.contains(event.relatedTarget)) {
+                    this.hidePreviewFrame(container);
+                }
+            });
+        }
     }
 }
 
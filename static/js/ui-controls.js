@@ -6,6 +6,7 @@ class UIControls {
         // DOM elements
         this.sizeSlider = document.getElementById('sizeSlider');
         this.sizeDisplay = document.getElementById('sizeDisplay');
+        this.sortSelect = document.getElementById('sortSelect');
         this.gallery = document.getElementById('gallery');
         this.breadcrumb = document.getElementById('breadcrumb');
         this.breadcrumbPath = document.getElementById('breadcrumbPath');
@@ -98,6 +99,13 @@ class UIControls {
             window.dispatchEvent(new CustomEvent('sizeChanged'));
         });
 
+        if (this.sortSelect) {
+            this.sortSelect.addEventListener('change', () => {
+                this.config.sortOrder = this.sortSelect.value;
+                window.dispatchEvent(new CustomEvent('sortChanged'));
+            });
+        }
+
         // Handle browser back/forward buttons
         window.addEventListener('popstate', () => {
             this.config.currentFolder = this.config.getCurrentFolder();
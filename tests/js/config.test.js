@@ -73,11 +73,13 @@ describe('GalleryConfig', () => {
       const config = new GalleryConfig();
       config.lastModified = 1234567890;
       config.itemCount = 42;
+      config.subtreeModified = 1234567999;
       
       config.resetChangeDetection();
       
       expect(config.lastModified).toBeNull();
       expect(config.itemCount).toBeNull();
+      expect(config.subtreeModified).toBeNull();
     });
   });
 
@@ -0,0 +1,103 @@
+// Tests for duplicates.js - Duplicate finder view
+
+const fs = require('fs');
+const path = require('path');
+
+// Load the module
+const duplicatesJS = fs.readFileSync(path.join(__dirname, '../../static/js/duplicates.js'), 'utf8');
+
+describe('DuplicatesView', () => {
+  let DuplicatesView, view;
+
+  const page = {
+    groups: [[
+      { filename: 'a.jpg', path: 'burst/a.jpg', folder: 'burst', size: 2048, modified: 1 },
+      { filename: 'b.jpg', path: 'burst/b.jpg', folder: 'burst', size: 1024, modified: 2 }
+    ]],
+    total_groups: 1,
+    redundant_files: 1,
+    distance: 4,
+    page: 1,
+    per_page: 50,
+    hashed: 10,
+    images: 20,
+    enabled: true
+  };
+
+  beforeEach(() => {
+    jest.useFakeTimers();
+
+    delete global.DuplicatesView;
+    delete window.DuplicatesView;
+
+    const modifiedDuplicatesJS = duplicatesJS + '\nglobal.DuplicatesView = DuplicatesView; window.DuplicatesView = DuplicatesView;';
+    eval(modifiedDuplicatesJS);
+
+    DuplicatesView = global.DuplicatesView || window.DuplicatesView;
+    view = new DuplicatesView();
+
+    view.container = document.createElement('div');
+    view.status = { textContent: '' };
+    view.distanceSelect = { value: '4' };
+    view.deleteButton = { disabled: true, textContent: '' };
+    view.moreButton = { style: { display: 'none' } };
+
+    global.fetch = jest.fn();
+    global.confirm = jest.fn(() => true);
+    global.alert = jest.fn();
+  });
+
+  afterEach(() => {
+    jest.useRealTimers();
+    jest.clearAllMocks();
+  });
+
+  test('should render groups and report hashing progress', async () => {
+    fetch.mockResolvedValueOnce({ ok: true, json: async () => page });
+    fetch.mockResolvedValueOnce({ ok: true, json: async () => ({ ready: [], pending: [] }) });
+
+    await view.load();
+
+    expect(fetch).toHaveBeenCalledWith('/api/duplicates?distance=4&page=1');
+    expect(view.container.querySelectorAll('.duplicate-file').length).toBe(2);
+    expect(view.status.textContent).toContain('1 groups');
+    expect(view.status.textContent).toContain('10 of 20');
+    expect(view.pendingPaths.has('burst/a.jpg')).toBe(true);
+  });
+
+  test('should show thumbnails as they become ready', async () => {
+    fetch.mockResolvedValueOnce({ ok: true, json: async () => page });
+    fetch.mockResolvedValueOnce({
+      ok: true,
+      json: async () => ({ ready: [{ path: 'burst/a.jpg', thumbnail: 'data:image/jpeg;base64,AAA' }], pending: ['burst/b.jpg'] })
+    });
+
+    await view.load();
+
+    const pollCall = fetch.mock.calls[1];
+    expect(pollCall[0]).toBe('/api/thumbnails/poll/150');
+    expect(view.container.querySelector('img').getAttribute('src')).toBe('data:image/jpeg;base64,AAA');
+    expect(view.pendingPaths.has('burst/a.jpg')).toBe(false);
+    expect(view.pendingPaths.has('burst/b.jpg')).toBe(true);
+  });
+
+  test('should delete the selected files in one batch', async () => {
+    fetch.mockResolvedValueOnce({ ok: true, json: async () => page });
+    fetch.mockResolvedValueOnce({ ok: true, json: async () => ({ ready: [], pending: [] }) });
+    await view.load();
+
+    view.container.querySelectorAll('.duplicate-select')[1].checked = true;
+    view.updateDeleteButton();
+    expect(view.deleteButton.disabled).toBe(false);
+
+    view.load = jest.fn();
+    fetch.mockResolvedValueOnce({ ok: true, json: async () => ({ results: [], deleted: 1, failed: 0 }) });
+    await view.deleteSelected();
+
+    expect(fetch).toHaveBeenLastCalledWith('/api/batch/delete', expect.objectContaining({
+      method: 'POST',
+      body: JSON.stringify({ paths: ['burst/b.jpg'] })
+    }));
+    expect(view.load).toHaveBeenCalled();
+  });
+});
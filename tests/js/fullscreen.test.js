@@ -0,0 +1,105 @@
+// Tests for fullscreen.js - Individual view and deleting from it
+
+const fs = require('fs');
+const path = require('path');
+
+// Load the modules
+const configJS = fs.readFileSync(path.join(__dirname, '../../static/js/config.js'), 'utf8');
+const fullscreenJS = fs.readFileSync(path.join(__dirname, '../../static/js/fullscreen.js'), 'utf8');
+
+describe('FullscreenManager', () => {
+  let config, FullscreenManager, fullscreen;
+
+  const burst = ['a.jpg', 'b.jpg', 'c.jpg', 'd.jpg'].map(filename => ({
+    type: 'image', filename, path: `burst/${filename}`
+  }));
+
+  beforeEach(() => {
+    delete global.GalleryConfig;
+    delete window.GalleryConfig;
+    delete global.FullscreenManager;
+    delete window.FullscreenManager;
+
+    const modifiedConfigJS = configJS + '\nglobal.GalleryConfig = GalleryConfig; window.GalleryConfig = GalleryConfig;';
+    const modifiedFullscreenJS = fullscreenJS + '\nglobal.FullscreenManager = FullscreenManager; window.FullscreenManager = FullscreenManager;';
+
+    eval(modifiedConfigJS);
+    eval(modifiedFullscreenJS);
+
+    const GalleryConfig = global.GalleryConfig || window.GalleryConfig;
+    config = new GalleryConfig();
+    config.allImages = burst.slice();
+    FullscreenManager = global.FullscreenManager || window.FullscreenManager;
+    fullscreen = new FullscreenManager(config);
+
+    fullscreen.fullscreenOverlay = document.createElement('div');
+    fullscreen.fullscreenImage = document.createElement('img');
+    fullscreen.fullscreenVideo = document.createElement('video');
+    fullscreen.fullscreenVideo.pause = jest.fn();
+    fullscreen.fullscreenVideo.load = jest.fn();
+    fullscreen.fullscreenVideo.play = jest.fn();
+
+    global.confirm = jest.fn(() => true);
+    global.alert = jest.fn();
+  });
+
+  afterEach(() => {
+    delete window.galleryLoader;
+    jest.clearAllMocks();
+  });
+
+  describe('Deleting marked media', () => {
+    test('should delete marked items in one batch and show the next survivor', async () => {
+      window.galleryLoader = {
+        deleteFiles: jest.fn(async (paths) => {
+          // The gallery reload replaces allImages
+          config.allImages = burst.filter(item => !paths.includes(item.path));
+          return { results: paths.map(p => ({ path: p, success: true })), deleted: paths.length, failed: 0 };
+        })
+      };
+
+      fullscreen.showFullscreen('/images/burst%2Fa.jpg');
+      fullscreen.toggleMarkCurrentMedia();
+      expect(fullscreen.fullscreenImage.classList.contains('marked-for-delete')).toBe(true);
+      fullscreen.showNextMedia();
+      expect(fullscreen.fullscreenImage.classList.contains('marked-for-delete')).toBe(false);
+      fullscreen.toggleMarkCurrentMedia();
+
+      await fullscreen.deleteCurrentMedia();
+
+      expect(confirm).toHaveBeenCalledWith(expect.stringContaining('2 marked files'));
+      expect(window.galleryLoader.deleteFiles).toHaveBeenCalledTimes(1);
+      expect(window.galleryLoader.deleteFiles).toHaveBeenCalledWith(['burst/a.jpg', 'burst/b.jpg']);
+      expect(fullscreen.markedPaths.size).toBe(0);
+      expect(config.allImages[fullscreen.currentIndividualImageIndex].path).toBe('burst/c.jpg');
+      expect(fullscreen.fullscreenImage.getAttribute('src')).toBe('/images/burst%2Fc.jpg');
+      expect(alert).not.toHaveBeenCalled();
+    });
+
+    test('should delete only the current item when nothing is marked', async () => {
+      window.galleryLoader = {
+        deleteFiles: jest.fn(async () => ({
+          results: [{ path: 'burst/c.jpg', success: false, error: 'Permission denied' }],
+          deleted: 0,
+          failed: 1
+        }))
+      };
+
+      fullscreen.showFullscreen('/images/burst%2Fc.jpg');
+      await fullscreen.deleteCurrentMedia();
+
+      expect(window.galleryLoader.deleteFiles).toHaveBeenCalledWith(['burst/c.jpg']);
+      expect(alert).toHaveBeenCalledWith(expect.stringContaining('Permission denied'));
+      expect(config.allImages[fullscreen.currentIndividualImageIndex].path).toBe('burst/c.jpg');
+    });
+
+    test('should forget marks when leaving the individual view', () => {
+      fullscreen.showFullscreen('/images/burst%2Fa.jpg');
+      fullscreen.toggleMarkCurrentMedia();
+
+      fullscreen.hideFullscreen();
+
+      expect(fullscreen.markedPaths.size).toBe(0);
+    });
+  });
+});
@@ -89,7 +89,20 @@ describe('GalleryLoader', () => {
       
       await galleryLoader.loadThumbnails();
       
-      expect(fetch).toHaveBeenCalledWith('/api/thumbnails/280');
+      expect(fetch).toHaveBeenCalledWith(expect.stringMatching(/^\/api\/thumbnails\/280\?visible=\d+$/));
+    });
+
+    test('should include sort order in API URL', async () => {
+      config.currentSize = 4;
+      config.sortOrder = '-taken';
+      fetch.mockResolvedValueOnce({
+        ok: true,
+        json: async () => []
+      });
+      
+      await galleryLoader.loadThumbnails();
+      
+      expect(fetch).toHaveBeenCalledWith(expect.stringMatching(/^\/api\/thumbnails\/280\?visible=\d+&sort=-taken$/));
     });
 
     test('should construct correct API URL for subfolder', async () => {
@@ -102,7 +115,7 @@ describe('GalleryLoader', () => {
       
       await galleryLoader.loadThumbnails();
       
-      expect(fetch).toHaveBeenCalledWith('/api/thumbnails/120/photos/vacation');
+      expect(fetch).toHaveBeenCalledWith(expect.stringMatching(/^\/api\/thumbnails\/120\/photos\/vacation\?visible=\d+$/));
     });
 
     test('should handle API response with mixed content', async () => {
@@ -240,6 +253,229 @@ describe('GalleryLoader', () => {
     });
   });
 
+  describe('Pending thumbnails', () => {
+    test('should render placeholder for pending image', async () => {
+      const mockData = [
+        { filename: 'slow.jpg', path: 'slow.jpg', type: 'image', pending: true }
+      ];
+      
+      fetch.mockResolvedValueOnce({
+        ok: true,
+        json: async () => mockData
+      });
+      
+      await galleryLoader.loadThumbnails();
+      
+      const html = galleryLoader.gallery.innerHTML;
+      expect(html).toContain('image-item pending');
+      expect(html).toContain('thumbnail-placeholder');
+      expect(galleryLoader.pendingItems.has('slow.jpg')).toBe(true);
+    });
+
+    test('should reserve space using reported dimensions', async () => {
+      const mockData = [
+        { filename: 'tall.jpg', path: 'tall.jpg', type: 'image', width: 200, height: 400, pending: true },
+        { filename: 'wide.jpg', path: 'wide.jpg', type: 'image', width: 400, height: 200, thumbnail: '/thumb.jpg' }
+      ];
+      
+      fetch.mockResolvedValueOnce({
+        ok: true,
+        json: async () => mockData
+      });
+      
+      await galleryLoader.loadThumbnails();
+      
+      const html = galleryLoader.gallery.innerHTML;
+      expect(html).toContain('aspect-ratio: 200 / 400;');
+      expect(html).toContain('width="400" height="200"');
+    });
+
+    test('should poll for pending thumbnails', async () => {
+      const mockData = [
+        { filename: 'slow.jpg', path: 'slow.jpg', type: 'image', pending: true }
+      ];
+      
+      config.currentSize = 3; // Medium = 180px
+      config.lastModified = 123456; // Skip change detection after loading
+      config.itemCount = 1;
+      fetch.mockResolvedValueOnce({
+        ok: true,
+        json: async () => mockData
+      });
+      fetch.mockResolvedValueOnce({
+        ok: true,
+        json: async () => ({ ready: [], pending: ['slow.jpg'] })
+      });
+      
+      await galleryLoader.loadThumbnails();
+      jest.advanceTimersByTime(galleryLoader.pollInterval);
+      
+      expect(fetch).toHaveBeenLastCalledWith('/api/thumbnails/poll/180', expect.objectContaining({
+        method: 'POST',
+        body: JSON.stringify({ paths: ['slow.jpg'], visible: [] })
+      }));
+    });
+
+    test('should resolve pending items from poll results', async () => {
+      const item = { filename: 'slow.jpg', path: 'slow.jpg', type: 'image', pending: true };
+      galleryLoader.pendingItems.set('slow.jpg', item);
+      
+      fetch.mockResolvedValueOnce({
+        ok: true,
+        json: async () => ({ ready: [{ path: 'slow.jpg', type: 'image', thumbnail: '/thumb.jpg' }], pending: [] })
+      });
+      
+      await galleryLoader.pollPendingThumbnails();
+      
+      expect(item.thumbnail).toBe('/thumb.jpg');
+      expect(item.pending).toBeUndefined();
+      expect(galleryLoader.pendingItems.size).toBe(0);
+      expect(galleryLoader.pendingTimer).toBeNull();
+    });
+
+    test('should stop polling when loading another folder', async () => {
+      galleryLoader.pendingItems.set('old.jpg', { path: 'old.jpg', type: 'image', pending: true });
+      fetch.mockResolvedValueOnce({
+        ok: true,
+        json: async () => []
+      });
+      
+      await galleryLoader.loadThumbnails();
+      
+      expect(galleryLoader.pendingItems.size).toBe(0);
+    });
+  });
+
+  describe('deleteFiles', () => {
+    test('should delete a batch in one request and reload once', async () => {
+      const results = {
+        results: [
+          { path: 'a.jpg', success: true },
+          { path: 'b.jpg', success: false, error: 'File not found', status: 404 }
+        ],
+        deleted: 1,
+        failed: 1
+      };
+      fetch.mockResolvedValueOnce({ ok: true, json: async () => results });
+      galleryLoader.loadThumbnails = jest.fn();
+
+      const data = await galleryLoader.deleteFiles(['a.jpg', 'b.jpg']);
+
+      expect(fetch).toHaveBeenCalledTimes(1);
+      expect(fetch).toHaveBeenCalledWith('/api/batch/delete', expect.objectContaining({
+        method: 'POST',
+        body: JSON.stringify({ paths: ['a.jpg', 'b.jpg'] })
+      }));
+      expect(galleryLoader.loadThumbnails).toHaveBeenCalledTimes(1);
+      expect(data).toEqual(results);
+    });
+
+    test('should not reload when nothing was deleted', async () => {
+      fetch.mockResolvedValueOnce({
+        ok: true,
+        json: async () => ({ results: [], deleted: 0, failed: 1 })
+      });
+      galleryLoader.loadThumbnails = jest.fn();
+
+      await galleryLoader.deleteFiles(['missing.jpg']);
+
+      expect(galleryLoader.loadThumbnails).not.toHaveBeenCalled();
+    });
+
+    test('should raise the server error for a rejected batch', async () => {
+      fetch.mockResolvedValueOnce({
+        ok: false,
+        status: 400,
+        json: async () => ({ error: 'Expected a non-empty list of paths' })
+      });
+
+      await expect(galleryLoader.deleteFiles([])).rejects.toThrow('Expected a non-empty list of paths');
+    });
+  });
+
+  describe('Preview strips', () => {
+    const strip = { frames: 5, frame_width: 320, frame_height: 180, times: [1, 3, 5, 7, 9], sprite: 'data:image/jpeg;base64,AAA' };
+
+    test('should fetch a strip once per video', async () => {
+      fetch.mockResolvedValueOnce({ ok: true, status: 200, json: async () => strip });
+
+      const first = await galleryLoader.getPreviewStrip('clips/a b.mp4');
+      const second = await galleryLoader.getPreviewStrip('clips/a b.mp4');
+
+      expect(fetch).toHaveBeenCalledTimes(1);
+      expect(fetch).toHaveBeenCalledWith('/api/preview-strip/clips%2Fa%20b.mp4');
+      expect(first).toEqual(strip);
+      expect(second).toEqual(strip);
+    });
+
+    test('should ask again for a pending strip after Retry-After', async () => {
+      fetch.mockResolvedValueOnce({
+        ok: true,
+        status: 202,
+        headers: { get: () => '2' },
+        json: async () => ({ pending: true })
+      });
+      fetch.mockResolvedValueOnce({ ok: true, status: 200, json: async () => strip });
+
+      expect(await galleryLoader.getPreviewStrip('clip.mp4')).toBeNull();
+      // Hovering meanwhile doesn't send more requests
+      expect(await galleryLoader.getPreviewStrip('clip.mp4')).toBeNull();
+      expect(fetch).toHaveBeenCalledTimes(1);
+
+      jest.advanceTimersByTime(2000);
+      expect(await galleryLoader.getPreviewStrip('clip.mp4')).toEqual(strip);
+      expect(fetch).toHaveBeenCalledTimes(2);
+    });
+
+    test('should show the frame under the pointer', () => {
+      const container = document.createElement('div');
+      container.innerHTML = '<img><div class="video-play-overlay"></div>';
+
+      galleryLoader.showPreviewFrame(container, strip, 0.5);
+      const preview = container.querySelector('.video-preview-frame');
+      expect(preview.nextElementSibling.className).toBe('video-play-overlay');
+      expect(preview.style.backgroundSize).toBe('500% 100%');
+      expect(preview.style.backgroundPosition).toMatch(/^50% 0/);
+
+      galleryLoader.showPreviewFrame(container, strip, 1);
+      expect(preview.style.backgroundPosition).toMatch(/^100% 0/);
+
+      galleryLoader.hidePreviewFrame(container);
+      expect(container.querySelector('.video-preview-frame')).toBeNull();
+    });
+  });
+
+  describe('Folder statistics', () => {
+    const folder = (newest) => ({
+      type: 'folder', name: '2024', path: 'albums/2024', size: 200,
+      stats: { images: 12, videos: 1, bytes: 4096, newest }
+    });
+
+    test('should show recursive counts on folder tiles', () => {
+      const html = galleryLoader.renderFolder(folder(100));
+
+      expect(html).toContain('class="folder-stats">12 photos &middot; 1 video<');
+      expect(galleryLoader.describeFolderStats({ images: 0, videos: 0 })).toBe('Empty');
+    });
+
+    test('should mark folders whose contents changed since the last load', async () => {
+      config.lastModified = 1;
+      config.itemCount = 1;
+
+      fetch.mockResolvedValueOnce({ ok: true, json: async () => [folder(100)] });
+      await galleryLoader.loadThumbnails();
+      expect(galleryLoader.gallery.innerHTML).not.toContain('updated');
+
+      fetch.mockResolvedValueOnce({ ok: true, json: async () => [folder(250)] });
+      await galleryLoader.loadThumbnails();
+      expect(galleryLoader.gallery.innerHTML).toContain('folder-item updated');
+
+      fetch.mockResolvedValueOnce({ ok: true, json: async () => [folder(250)] });
+      await galleryLoader.loadThumbnails();
+      expect(galleryLoader.gallery.innerHTML).not.toContain('updated');
+    });
+  });
+
   describe('checkForChanges', () => {
     test('should make correct API call for root folder', async () => {
       config.currentFolder = '';
@@ -311,6 +547,26 @@ describe('GalleryLoader', () => {
       expect(config.itemCount).toBe(15);
     });
 
+    test('should detect nested changes once the folder is indexed', async () => {
+      config.lastModified = 123456;
+      config.itemCount = 10;
+      config.subtreeModified = null;
+
+      // The index reaching the folder isn't a change by itself
+      fetch.mockResolvedValueOnce({
+        ok: true,
+        json: async () => ({ last_modified: 123456, item_count: 10, subtree_modified: 200000 })
+      });
+      expect(await galleryLoader.checkForChanges()).toBe(false);
+      expect(config.subtreeModified).toBe(200000);
+
+      fetch.mockResolvedValueOnce({
+        ok: true,
+        json: async () => ({ last_modified: 123456, item_count: 10, subtree_modified: 300000 })
+      });
+      expect(await galleryLoader.checkForChanges()).toBe(true);
+    });
+
     test('should handle API errors gracefully', async () => {
       fetch.mockRejectedValueOnce(new Error('API error'));
       
@@ -188,4 +188,22 @@ describe('UIControls', () => {
       expect(config.itemCount).toBeNull();
     });
   });
+
+  describe('Sort order', () => {
+    test('should update sort order and reload on change', () => {
+      uiControls.sizeSlider = { addEventListener: jest.fn() };
+      uiControls.sortSelect = { value: '-taken', addEventListener: jest.fn() };
+      
+      uiControls.setupEventListeners();
+      
+      const [eventName, handler] = uiControls.sortSelect.addEventListener.mock.calls[0];
+      expect(eventName).toBe('change');
+      handler();
+      
+      expect(config.sortOrder).toBe('-taken');
+      expect(window.dispatchEvent).toHaveBeenCalledWith(expect.objectContaining({
+        type: 'sortChanged'
+      }));
+    });
+  });
 });
\ No newline at end of file
@@ -3,6 +3,13 @@ import sys
 import os
 import tempfile
 import shutil
+import gzip
+import subprocess
+import time
+import base64
+import io
+import json
+from PIL import Image
 from unittest.mock import patch
 
 # Add the app directory to Python path
@@ -10,7 +17,10 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Mock the IMAGES_FOLDER environment variable to use a temp directory
 temp_images_dir = tempfile.mkdtemp()
-with patch.dict(os.environ, {'IMAGES_FOLDER': temp_images_dir}):
+temp_runtime_dir = tempfile.mkdtemp()
+with patch.dict(os.environ, {'IMAGES_FOLDER': temp_images_dir, 'RUNTIME_FOLDER': temp_runtime_dir,
+                             'DUPLICATE_DETECTION': 'false'}):
+    import app as app_module
     from app import allowed_file, allowed_video, is_media_file, get_breadcrumb_path, get_safe_path, IMAGES_FOLDER, app
 
 class TestSimple(unittest.TestCase):
@@ -20,6 +30,7 @@ class TestSimple(unittest.TestCase):
         """Clean up temp directory after all tests"""
         try:
             shutil.rmtree(temp_images_dir)
+            shutil.rmtree(temp_runtime_dir)
         except:
             pass  # Ignore cleanup errors
     
@@ -158,6 +169,64 @@ class TestSimple(unittest.TestCase):
             self.assertIsInstance(data['videos_count'], int)
             self.assertIsInstance(data['subfolders_count'], int)
     
+    def test_health_probes(self):
+        """Test the liveness, readiness and stats endpoints"""
+        with app.test_client() as client:
+            self.assertEqual(client.get('/health/live').get_json(), {'status': 'alive'})
+
+            data = client.get('/health/ready').get_json()
+            self.assertEqual(data['status'], 'ready')
+            self.assertEqual(set(data['checks'].values()), {'ok'})
+
+            # A read-only images mount only disables caching
+            def read_only_cache(folder):
+                if folder == app_module.CACHE_FOLDER:
+                    raise PermissionError('Read-only file system')
+
+            with patch.object(app_module, 'check_folder_writable', read_only_cache):
+                response = client.get('/health/ready')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.get_json()['status'], 'degraded')
+                self.assertNotEqual(response.get_json()['checks']['cache_writable'], 'ok')
+
+            with patch.object(app_module, 'IMAGES_FOLDER', os.path.join(temp_images_dir, 'missing')):
+                response = client.get('/health/ready')
+                self.assertEqual(response.status_code, 503)
+                self.assertNotEqual(response.get_json()['checks']['images_mount'], 'ok')
+
+            # A stalled mount fails the check instead of hanging the probe
+            import threading
+            release = threading.Event()
+            with patch.object(app_module, 'READINESS_TIMEOUT', 0.05), \
+                 patch.object(app_module, 'check_images_mount', release.wait):
+                checks = client.get('/health/ready').get_json()['checks']
+                self.assertIn('timed out', checks['images_mount'])
+                checks = client.get('/health/ready').get_json()['checks']
+                self.assertIn('still', checks['images_mount'])
+            release.set()
+
+            app_module.library_index.scan(blocking=True)
+            data = client.get('/health/stats').get_json()
+            self.assertTrue(data['warmup']['index_ready'])
+            self.assertIsInstance(data['library']['images'], int)
+            self.assertIn('thumbnails_queued', data['worker'])
+
+            # Uptime counts from the worker's fork, not from the preloading master
+            app_module.count_event('thumbnails_generated')
+            read_fd, write_fd = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(read_fd)
+                os.write(write_fd, json.dumps([app_module.WORKER_STARTED,
+                                               app_module.worker_counters['thumbnails_generated']]).encode())
+                os._exit(0)
+            os.close(write_fd)
+            with os.fdopen(read_fd) as pipe:
+                child_started, child_generated = json.loads(pipe.read())
+            os.waitpid(pid, 0)
+            self.assertGreater(child_started, app_module.WORKER_STARTED)
+            self.assertEqual(child_generated, 0)
+
     def test_no_cache_headers(self):
         """Test that API endpoints include no-cache headers"""
         with app.test_client() as client:
@@ -179,5 +248,587 @@ class TestSimple(unittest.TestCase):
             self.assertEqual(response.headers.get('Pragma'), 'no-cache')
             self.assertEqual(response.headers.get('Expires'), '0')
 
+    def test_json_compression(self):
+        """Test that JSON API responses are compressed when the client accepts gzip"""
+        with app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['authenticated'] = True
+
+            with patch.object(app_module, 'COMPRESSION_MIN_SIZE', 1):
+                response = client.get('/api/thumbnails/200', headers={'Accept-Encoding': 'gzip'})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.headers.get('Content-Encoding'), 'gzip')
+                self.assertIn('Accept-Encoding', response.headers.get('Vary', ''))
+                compressed = response.get_data()
+
+                # Clients that don't advertise support get the plain payload
+                response = client.get('/api/thumbnails/200')
+                self.assertIsNone(response.headers.get('Content-Encoding'))
+                self.assertEqual(gzip.decompress(compressed), response.get_data())
+
+            # Responses below the minimum size are left uncompressed
+            with patch.object(app_module, 'COMPRESSION_MIN_SIZE', 10 ** 9):
+                response = client.get('/api/thumbnails/200', headers={'Accept-Encoding': 'gzip'})
+            self.assertIsNone(response.headers.get('Content-Encoding'))
+
+    def test_compressed_payload_cache(self):
+        """Test that identical payloads are only compressed once"""
+        payload = b'{"type": "image", "filename": "a.jpg"}' * 100
+        first = app_module.get_compressed_payload(payload, 'gzip')
+        with patch.object(app_module, 'compress_payload') as mock_compress:
+            second = app_module.get_compressed_payload(payload, 'gzip')
+            mock_compress.assert_not_called()
+        self.assertEqual(first, second)
+        self.assertEqual(gzip.decompress(second), payload)
+
+    def test_video_stack_loaded_lazily(self):
+        """Test that importing the app does not load OpenCV or NumPy"""
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        code = (
+            "import sys; sys.path.insert(0, %r); import app; "
+            "print(','.join(m for m in ('cv2', 'numpy') if m in sys.modules))" % project_root
+        )
+        env = dict(os.environ, IMAGES_FOLDER=temp_images_dir)
+        result = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), '')
+
+    def test_scheduler_visible_jobs_first(self):
+        """Test that thumbnails reported as visible jump ahead of prefetch work"""
+        scheduler = app_module.ThumbnailScheduler(2, tempfile.mkdtemp())
+        scheduler._reset()
+        scheduler.pid = os.getpid()  # Don't start worker threads
+
+        for name in ('a.jpg', 'b.jpg', 'c.jpg'):
+            scheduler.submit('image', name, 100, name, app_module.PRIORITY_PREFETCH)
+        scheduler.submit('image', 'c.jpg', 100, 'c.jpg', app_module.PRIORITY_VISIBLE)
+
+        key, job = scheduler._next_job()
+        self.assertEqual(key, (100, 'c.jpg'))
+        self.assertEqual(job['priority'], app_module.PRIORITY_VISIBLE)
+
+        # Only threads - 1 prefetch jobs may run at once
+        key, _ = scheduler._next_job()
+        self.assertEqual(key, (100, 'a.jpg'))
+        scheduler.running_prefetch = 1
+        self.assertIsNone(scheduler._next_job())
+
+    def test_scheduler_jobs_claimed_across_workers(self):
+        """Test that workers share queued jobs, priority bumps and failures"""
+        marker_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, marker_folder, ignore_errors=True)
+        workers = [app_module.ThumbnailScheduler(2, marker_folder) for _ in range(2)]
+        for scheduler in workers:
+            scheduler._reset()
+            scheduler.pid = os.getpid()  # Don't start worker threads
+            for name in ('a.jpg', 'b.jpg'):
+                scheduler.submit('image', name, 100, name, app_module.PRIORITY_PREFETCH)
+        self.assertEqual([len(scheduler.jobs) for scheduler in workers], [2, 0])
+
+        # A visible poll answered by another worker still moves the job to the front
+        workers[1].submit('image', 'b.jpg', 100, 'b.jpg', app_module.PRIORITY_VISIBLE)
+        self.assertEqual(len(workers[1].jobs), 0)
+        with workers[0].condition:
+            key, job = workers[0]._next_job()
+        self.assertEqual(key, (100, 'b.jpg'))
+        self.assertEqual(job['priority'], app_module.PRIORITY_VISIBLE)
+
+        # Once the job is done it can be claimed again
+        workers[0]._release(key)
+        workers[1].submit('image', 'b.jpg', 100, 'b.jpg', app_module.PRIORITY_VISIBLE)
+        self.assertEqual(len(workers[1].jobs), 1)
+
+        # An exiting worker gives up its queued jobs
+        workers[0]._remove_markers()
+        workers[1].submit('image', 'a.jpg', 100, 'a.jpg', app_module.PRIORITY_PREFETCH)
+        self.assertIn((100, 'a.jpg'), workers[1].jobs)
+
+        # So does one that died without cleaning up
+        child = subprocess.Popen([sys.executable, '-c', 'pass'])
+        child.wait()
+        with open(workers[0]._marker_path((100, 'c.jpg')), 'w') as f:
+            f.write(str(child.pid))
+        workers[0].submit('image', 'c.jpg', 100, 'c.jpg', app_module.PRIORITY_PREFETCH)
+        self.assertIn((100, 'c.jpg'), workers[0].jobs)
+
+        # Failures are seen by every worker until the file changes
+        item_path = os.path.join(marker_folder, 'broken.jpg')
+        with open(item_path, 'wb') as f:
+            f.write(b'not an image')
+        workers[0].record_failure(100, 'broken.jpg', item_path)
+        self.assertTrue(workers[1].failed(100, 'broken.jpg', item_path))
+        self.assertFalse(workers[1].failed(200, 'broken.jpg', item_path))
+        with open(item_path, 'wb') as f:
+            f.write(b'still not an image')
+        self.assertFalse(workers[1].failed(100, 'broken.jpg', item_path))
+
+    def test_deferred_thumbnails_are_polled(self):
+        """Test that only visible thumbnails are generated inline and the rest can be polled"""
+        folder = os.path.join(temp_images_dir, 'scheduled')
+        os.makedirs(folder, exist_ok=True)
+        for i in range(4):
+            Image.new('RGB', (320, 240), (i * 60, 0, 0)).save(os.path.join(folder, f'img{i}.jpg'))
+
+        with app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['authenticated'] = True
+
+            items = client.get('/api/thumbnails/100/scheduled?visible=1').get_json()
+            self.assertEqual(len(items), 4)
+            self.assertIn('thumbnail', items[0])
+            pending = [item['path'] for item in items if item.get('pending')]
+            self.assertEqual(pending, [f'scheduled/img{i}.jpg' for i in range(1, 4)])
+
+            ready = {}
+            deadline = time.time() + 10
+            while pending and time.time() < deadline:
+                response = client.post('/api/thumbnails/poll/100', json={'paths': pending, 'visible': pending[:1]})
+                self.assertEqual(response.status_code, 200)
+                data = response.get_json()
+                ready.update({item['path']: item for item in data['ready']})
+                pending = data['pending']
+                time.sleep(0.05)
+
+            self.assertEqual(pending, [])
+            self.assertTrue(all(item['thumbnail'].startswith('data:image/jpeg') for item in ready.values()))
+
+    def test_admission_controller_limits_jobs(self):
+        """Test that generation slots are capped and released"""
+        lock_folder = tempfile.mkdtemp()
+        try:
+            controller = app_module.AdmissionController(1, lock_folder)
+            with controller.slot(blocking=False) as admitted:
+                self.assertTrue(admitted)
+                # A second controller stands in for another gunicorn worker
+                other = app_module.AdmissionController(1, lock_folder)
+                with other.slot(blocking=False) as other_admitted:
+                    self.assertFalse(other_admitted)
+            with controller.slot(blocking=False) as admitted:
+                self.assertTrue(admitted)
+        finally:
+            shutil.rmtree(lock_folder, ignore_errors=True)
+
+    def test_listing_over_budget_returns_placeholders(self):
+        """Test that listings return placeholders instead of blocking when over budget"""
+        folder = os.path.join(temp_images_dir, 'overbudget')
+        os.makedirs(folder, exist_ok=True)
+        Image.new('RGB', (320, 240)).save(os.path.join(folder, 'busy.jpg'))
+
+        lock_folder = tempfile.mkdtemp()
+        controller = app_module.AdmissionController(1, lock_folder)
+        try:
+            with patch.object(app_module, 'admission_controller', controller):
+                with app.test_client() as client:
+                    with client.session_transaction() as sess:
+                        sess['authenticated'] = True
+
+                    with controller.slot(blocking=False) as admitted:
+                        self.assertTrue(admitted)
+                        items = client.get('/api/thumbnails/100/overbudget?visible=10').get_json()
+
+            self.assertEqual(len(items), 1)
+            self.assertTrue(items[0]['pending'])
+            self.assertNotIn('thumbnail', items[0])
+        finally:
+            shutil.rmtree(lock_folder, ignore_errors=True)
+
+    def test_search_library(self):
+        """Test searching the whole library through the index"""
+        folder = os.path.join(temp_images_dir, 'search', 'deep', 'er')
+        os.makedirs(folder, exist_ok=True)
+        Image.new('RGB', (64, 64)).save(os.path.join(folder, 'Sunset_Beach.jpg'))
+        Image.new('RGB', (640, 480)).save(os.path.join(temp_images_dir, 'search', 'sunset_big.png'))
+        with open(os.path.join(folder, 'sunset.mp4'), 'wb') as f:
+            f.write(b'\0' * 10)
+
+        app_module.library_index.scan(blocking=True)
+
+        with app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['authenticated'] = True
+
+            data = client.get('/api/search?q=sunset&type=image&sort=-size').get_json()
+            self.assertEqual(data['total'], 2)
+            self.assertEqual([r['path'] for r in data['results']],
+                             ['search/sunset_big.png', 'search/deep/er/Sunset_Beach.jpg'])
+            self.assertIsNotNone(data['indexed_at'])
+
+            data = client.get('/api/search?glob=*.mp4').get_json()
+            self.assertEqual([r['path'] for r in data['results']], ['search/deep/er/sunset.mp4'])
+
+            data = client.get('/api/search?q=sunset&per_page=1&page=2&sort=path').get_json()
+            self.assertEqual(data['total'], 3)
+            self.assertEqual(len(data['results']), 1)
+
+            response = client.get('/api/search?sort=colour')
+            self.assertEqual(response.status_code, 400)
+
+            for query in ('page=99999999999999999999', 'min_size=99999999999999999999'):
+                response = client.get(f'/api/search?{query}')
+                self.assertEqual(response.status_code, 400)
+
+        # Removed folders drop out of the index on the next scan
+        shutil.rmtree(os.path.join(temp_images_dir, 'search', 'deep'))
+        app_module.library_index.scan(blocking=True)
+        results, total = app_module.library_index.search(query='sunset')
+        self.assertEqual(total, 1)
+
+        # Workers skip a periodic scan another worker just finished
+        self.assertFalse(app_module.library_index.scan(max_age=60))
+        self.assertLess(app_module.library_index.scan_age(), 60)
+        self.assertTrue(app_module.library_index.scan(max_age=0))
+
+    def test_refresh_keeps_new_subfolders(self):
+        """Test that a folder refresh doesn't hide new subfolders from the scan"""
+        folder = os.path.join(temp_images_dir, 'late')
+        os.makedirs(folder, exist_ok=True)
+        self.addCleanup(app_module.library_index.scan, blocking=True)
+        self.addCleanup(shutil.rmtree, folder, ignore_errors=True)
+        index = app_module.library_index
+        index.scan(blocking=True)
+
+        os.makedirs(os.path.join(folder, 'inner'))
+        Image.new('RGB', (32, 32)).save(os.path.join(folder, 'inner', 'latecomer.jpg'))
+        # A listing or delete refreshes the parent before the scan gets there
+        index.refresh_folder('late')
+        self.assertNotIn('late/inner', index.folder_stats(['late/inner']))
+        index.scan(blocking=True)
+
+        results, total = index.search(query='latecomer')
+        self.assertEqual([r['path'] for r in results], ['late/inner/latecomer.jpg'])
+        self.assertEqual(index.folder_stats(['late'])['late']['images'], 1)
+
+    def test_listing_includes_metadata(self):
+        """Test that listings report cached header metadata and honour EXIF orientation"""
+        folder = os.path.join(temp_images_dir, 'metadata')
+        os.makedirs(folder, exist_ok=True)
+
+        # Landscape pixels stored with 'rotate 90' orientation, taken in 2021
+        img = Image.new('RGB', (400, 200))
+        exif = img.getexif()
+        exif[app_module.EXIF_ORIENTATION] = 6
+        exif_ifd = exif.get_ifd(app_module.EXIF_IFD)
+        exif_ifd[app_module.EXIF_DATETIME_ORIGINAL] = '2021:05:06 07:08:09'
+        exif[app_module.EXIF_IFD] = exif_ifd
+        img.save(os.path.join(folder, 'a_rotated.jpg'), exif=exif.tobytes())
+
+        # No EXIF - sorted by modification time instead (2023)
+        plain_path = os.path.join(folder, 'b_plain.png')
+        Image.new('RGB', (300, 100)).save(plain_path)
+        os.utime(plain_path, (1700000000, 1700000000))
+
+        with app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['authenticated'] = True
+
+            # Nothing on screen yet: the listing doesn't read headers and sorts
+            # by modification time until the metadata is cached
+            items = client.get('/api/thumbnails/100/metadata?visible=0&sort=taken').get_json()
+            self.assertEqual([item['filename'] for item in items], ['b_plain.png', 'a_rotated.jpg'])
+            self.assertTrue(all(item.get('pending') and 'width' not in item for item in items))
+
+            # The thumbnail jobs read it and the poll delivers it
+            pending = [item['path'] for item in items]
+            ready = {}
+            deadline = time.time() + 10
+            while pending and time.time() < deadline:
+                data = client.post('/api/thumbnails/poll/100', json={'paths': pending}).get_json()
+                ready.update((item['path'], item) for item in data['ready'])
+                pending = data['pending']
+                time.sleep(0.05)
+            self.assertEqual(ready['metadata/a_rotated.jpg']['taken'], '2021-05-06T07:08:09')
+
+            items = client.get('/api/thumbnails/100/metadata').get_json()
+            rotated = items[0]
+            self.assertEqual(rotated['filename'], 'a_rotated.jpg')
+            self.assertEqual((rotated['width'], rotated['height']), (200, 400))
+            self.assertEqual(rotated['orientation'], 6)
+            self.assertEqual(rotated['taken'], '2021-05-06T07:08:09')
+            self.assertEqual((items[1]['width'], items[1]['height']), (300, 100))
+            self.assertIsNone(items[1]['taken'])
+
+            # The thumbnail itself is rotated upright
+            thumb_data = base64.b64decode(rotated['thumbnail'].split(',', 1)[1])
+            with Image.open(io.BytesIO(thumb_data)) as thumb:
+                self.assertGreater(thumb.height, thumb.width)
+
+            items = client.get('/api/thumbnails/100/metadata?sort=-taken').get_json()
+            self.assertEqual([item['filename'] for item in items], ['b_plain.png', 'a_rotated.jpg'])
+
+        # Metadata is cached on disk keyed like thumbnails
+        metadata_file = app_module.get_metadata_filename('metadata/a_rotated.jpg',
+                                                         os.path.getsize(os.path.join(folder, 'a_rotated.jpg')))
+        self.assertTrue(os.path.exists(os.path.join(app_module.METADATA_FOLDER, metadata_file)))
+
+    def test_thumbnail_backends(self):
+        """Test that every resize/encode backend fits the size and honours EXIF orientation"""
+        img = Image.new('RGB', (800, 400), 'red')
+        exif = img.getexif()
+        exif[app_module.EXIF_ORIENTATION] = 6
+        source = io.BytesIO()
+        img.save(source, 'JPEG', exif=exif.tobytes())
+        import numpy as np
+        frame = np.zeros((400, 800, 3), dtype=np.uint8)
+        frame[:, :, 2] = 255  # red in OpenCV's BGR order
+
+        for name, backend in app_module.THUMBNAIL_BACKENDS.items():
+            with self.subTest(backend=name):
+                with Image.open(io.BytesIO(source.getvalue())) as opened:
+                    data = backend.resize_image(opened, 100)
+                with Image.open(io.BytesIO(data)) as thumb:
+                    self.assertEqual(thumb.format, 'JPEG')
+                    self.assertEqual(thumb.size, (50, 100))
+                    r, g, b = thumb.convert('RGB').getpixel((25, 50))
+                    self.assertGreater(r, 200)
+                    self.assertLess(b, 50)
+
+                with Image.open(io.BytesIO(backend.resize_frame(frame, 100))) as thumb:
+                    self.assertEqual(thumb.size, (100, 50))
+                    self.assertGreater(thumb.convert('RGB').getpixel((50, 25))[0], 200)
+
+        with patch.object(app_module, 'THUMBNAIL_BACKEND', 'cv2-area'):
+            self.assertIs(app_module.get_thumbnail_backend(), app_module.THUMBNAIL_BACKENDS['cv2-area'])
+
+    def test_preview_strip(self):
+        """Test building a video's hover preview strip in one pass"""
+        cv2 = app_module.get_cv2()
+        import numpy as np
+
+        folder = os.path.join(temp_images_dir, 'clips')
+        os.makedirs(folder, exist_ok=True)
+        video_path = os.path.join(folder, 'ramp.avi')
+        writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 32))
+        for i in range(40):
+            # Brightness rises with time so frame order can be checked
+            writer.write(np.full((32, 64, 3), i * 6, dtype=np.uint8))
+        writer.release()
+
+        with app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['authenticated'] = True
+
+            def fetch_strip(path):
+                # Generated in the background; the request only reports progress
+                deadline = time.time() + 10
+                response = client.get(path)
+                while response.status_code == 202 and time.time() < deadline:
+                    self.assertEqual(response.headers['Retry-After'], '1')
+                    time.sleep(0.05)
+                    response = client.get(path)
+                return response
+
+            with patch.object(app_module, 'PREVIEW_STRIP_FRAMES', 4), \
+                 patch.object(app_module, 'PREVIEW_STRIP_HEIGHT', 16):
+                response = fetch_strip('/api/preview-strip/clips/ramp.avi')
+                self.assertEqual(response.status_code, 200)
+                strip = response.get_json()
+                self.assertEqual(strip['frames'], 4)
+                self.assertEqual((strip['frame_width'], strip['frame_height']), (32, 16))
+                self.assertEqual(strip['times'], [0.5, 1.5, 2.5, 3.5])
+                self.assertEqual(strip['duration'], 4.0)
+
+                sprite_data = base64.b64decode(strip['sprite'].split(',', 1)[1])
+                with Image.open(io.BytesIO(sprite_data)) as sprite:
+                    self.assertEqual(sprite.size, (128, 16))
+                    levels = [sprite.convert('L').getpixel((x * 32 + 16, 8)) for x in range(4)]
+                self.assertEqual(levels, sorted(levels))
+                self.assertGreater(levels[-1] - levels[0], 100)
+
+                # Served from the cache the second time
+                with patch.object(app_module, 'get_cv2', side_effect=AssertionError):
+                    self.assertEqual(client.get('/api/preview-strip/clips/ramp.avi').get_json(), strip)
+
+                # Long clips seek to each frame and end up with the same strip
+                shutil.copy(video_path, os.path.join(folder, 'long.avi'))
+                with patch.object(app_module, 'PREVIEW_STRIP_SEEK_AFTER', 1):
+                    long_strip = app_module.create_preview_strip(os.path.join(folder, 'long.avi'), 'clips/long.avi')
+                self.assertEqual(long_strip['times'], strip['times'])
+
+            with open(os.path.join(folder, 'broken.mp4'), 'wb') as f:
+                f.write(b'not a video')
+            self.addCleanup(os.remove, os.path.join(folder, 'broken.mp4'))
+            response = fetch_strip('/api/preview-strip/clips/broken.mp4')
+            self.assertEqual(response.status_code, 500)
+
+            response = client.get('/api/preview-strip/clips/missing.avi')
+            self.assertEqual(response.status_code, 404)
+
+    def test_duplicate_detection(self):
+        """Test hashing images and grouping near-duplicates"""
+        folder = os.path.join(temp_images_dir, 'bursts')
+        os.makedirs(os.path.join(folder, 'copies'), exist_ok=True)
+
+        def pattern(size, flip=False):
+            img = Image.new('L', (8, 8))
+            img.putdata([((x * 37 + y * 11) % 7) * 36 for y in range(8) for x in range(8)])
+            if flip:
+                img = img.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+            return img.resize(size, Image.Resampling.NEAREST).convert('RGB')
+
+        pattern((640, 480)).save(os.path.join(folder, 'burst_1.jpg'), quality=95)
+        pattern((640, 480)).save(os.path.join(folder, 'burst_2.jpg'), quality=60)
+        pattern((320, 240)).save(os.path.join(folder, 'copies', 'burst_small.png'))
+        pattern((640, 480), flip=True).save(os.path.join(folder, 'different.jpg'))
+
+        app_module.library_index.scan(blocking=True)
+        while app_module.duplicate_finder.hash_pending():
+            pass
+
+        with app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['authenticated'] = True
+
+            data = client.get('/api/duplicates?distance=4').get_json()
+            self.assertEqual(data['hashed'], data['images'])
+            groups = [[f['path'] for f in group] for group in data['groups']]
+            self.assertIn(['bursts/burst_1.jpg', 'bursts/burst_2.jpg', 'bursts/copies/burst_small.png'], groups)
+            self.assertNotIn('bursts/different.jpg', sum(groups, []))
+
+            response = client.get('/api/duplicates?distance=64')
+            self.assertEqual(response.status_code, 400)
+
+            self.assertEqual(client.get('/duplicates').status_code, 200)
+
+            # Deleted files leave their group
+            client.post('/api/batch/delete', json={'paths': ['bursts/burst_2.jpg']})
+            groups = [[f['path'] for f in group] for group in client.get('/api/duplicates').get_json()['groups']]
+            self.assertIn(['bursts/burst_1.jpg', 'bursts/copies/burst_small.png'], groups)
+
+        # Brute force agrees with the multi-index search
+        import numpy as np
+        rng = np.random.default_rng(0)
+        hashes = rng.integers(0, 1 << 62, 2000, dtype=np.int64).view(np.uint64)
+        hashes[1000:1100] = hashes[:100] ^ (np.uint64(1) << rng.integers(0, 64, 100).astype(np.uint64))
+        hashes[1100:1200] = hashes[1000:1100] ^ np.uint64(0b101 << 40)
+        groups = app_module.find_duplicate_groups(hashes, 3)
+        found = {(int(group.min()), int(group.max())) for group in groups}
+        self.assertEqual(len(groups), 100)
+        self.assertEqual(found, {(i, i + 1100) for i in range(100)})
+
+        # Two flipped bits per chunk, set on opposite sides of each pair
+        bits = np.array([0, 1, 22, 23, 43, 44], dtype=np.uint64)
+        base = rng.integers(0, 1 << 62, 200, dtype=np.int64).view(np.uint64)
+        base &= ~np.bitwise_or.reduce(np.uint64(1) << bits)
+        partners = base | np.bitwise_or.reduce(np.uint64(1) << bits[1::2])
+        base |= np.bitwise_or.reduce(np.uint64(1) << bits[::2])
+        groups = app_module.find_duplicate_groups(np.concatenate([base, partners]), 6)
+        self.assertEqual({(int(group.min()), int(group.max())) for group in groups},
+                         {(i, i + 200) for i in range(200)})
+
+    def test_batch_delete(self):
+        """Test deleting several files at once and invalidating their caches"""
+        folder = os.path.join(temp_images_dir, 'burst', 'day1')
+        os.makedirs(folder, exist_ok=True)
+        for name in ('a.jpg', 'b.jpg'):
+            Image.new('RGB', (64, 64)).save(os.path.join(folder, name))
+        with open(os.path.join(folder, 'notes.txt'), 'w') as f:
+            f.write('keep me')
+        filesize = os.path.getsize(os.path.join(folder, 'a.jpg'))
+
+        with app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['authenticated'] = True
+
+            # Generate the thumbnails and the preview shown on the parent folder tile
+            client.get('/api/thumbnails/100/burst/day1')
+            client.get('/api/thumbnails/100/burst')
+            cache_dir = os.path.join(app_module.CACHE_FOLDER, '100')
+            thumb = os.path.join(cache_dir, app_module.get_cache_filename('burst/day1/a.jpg', filesize, 100))
+            preview = os.path.join(cache_dir, app_module.get_cache_filename('burst/day1', filesize, 100))
+            self.assertTrue(os.path.exists(thumb))
+            self.assertTrue(os.path.exists(preview))
+
+            response = client.post('/api/batch/delete', json={'paths': [
+                'burst/day1/a.jpg', 'burst/day1/a.jpg', 'burst/day1/missing.jpg',
+                'burst/day1/notes.txt', 'burst/../../escape.jpg', 'burst/day1/b.jpg', 'burst/day1/./b.jpg'
+            ]})
+            self.assertEqual(response.status_code, 200)
+            data = response.get_json()
+            self.assertEqual((data['deleted'], data['failed']), (2, 4))
+            errors = {r['path']: r.get('error') for r in data['results']}
+            self.assertEqual(errors, {
+                'burst/day1/a.jpg': None,
+                'burst/day1/missing.jpg': 'File not found',
+                'burst/day1/notes.txt': 'Can only delete media files',
+                'burst/../../escape.jpg': 'Access denied',
+                'burst/day1/b.jpg': None,
+                'burst/day1/./b.jpg': 'File not found',
+            })
+
+            self.assertEqual(os.listdir(folder), ['notes.txt'])
+            self.assertFalse(os.path.exists(thumb))
+            self.assertFalse(os.path.exists(preview))
+
+            # The single-file endpoint shares the same path checks
+            response = client.delete('/api/delete/burst/..%2F..%2Fescape.jpg')
+            self.assertEqual(response.status_code, 403)
+
+            response = client.post('/api/batch/delete', json={'paths': []})
+            self.assertEqual(response.status_code, 400)
+
+    def test_folder_statistics(self):
+        """Test recursive folder totals kept current as files come and go"""
+        trip = os.path.join(temp_images_dir, 'albums', '2024', 'trip')
+        os.makedirs(trip, exist_ok=True)
+        # Keep the other tests' search results free of these files
+        self.addCleanup(app_module.library_index.scan, blocking=True)
+        self.addCleanup(shutil.rmtree, os.path.join(temp_images_dir, 'albums'), ignore_errors=True)
+        for name in ('a.jpg', 'b.jpg'):
+            Image.new('RGB', (32, 32)).save(os.path.join(trip, name))
+        with open(os.path.join(temp_images_dir, 'albums', '2024', 'clip.mp4'), 'wb') as f:
+            f.write(b'\0' * 100)
+        image_bytes = sum(os.path.getsize(os.path.join(trip, name)) for name in ('a.jpg', 'b.jpg'))
+
+        index = app_module.library_index
+        index.scan(blocking=True)
+        stats = index.folder_stats(['albums', 'albums/2024', 'albums/2024/trip'])
+        self.assertEqual((stats['albums']['images'], stats['albums']['videos']), (2, 1))
+        self.assertEqual(stats['albums']['bytes'], image_bytes + 100)
+        self.assertEqual(stats['albums/2024/trip']['images'], 2)
+        self.assertEqual(stats['albums']['newest'], stats['albums/2024']['newest'])
+        self.assertGreaterEqual(index.stats()['images'], 2)
+
+        with app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['authenticated'] = True
+
+            tiles = client.get('/api/thumbnails/100/albums').get_json()
+            self.assertEqual(tiles[0]['stats']['images'], 2)
+            self.assertEqual(tiles[0]['stats']['videos'], 1)
+
+            before = client.get('/api/check-changes/albums').get_json()
+            # item_count keeps counting direct entries; the totals are in stats
+            self.assertEqual(before['item_count'], 1)
+            self.assertEqual(before['stats']['images'], 2)
+
+            # A change in a direct subfolder is seen straight away
+            year = os.path.join(temp_images_dir, 'albums', '2024')
+            with open(os.path.join(year, 'clip2.mp4'), 'wb') as f:
+                f.write(b'\0' * 10)
+            os.utime(year, (before['last_modified'] + 5, before['last_modified'] + 5))
+            after = client.get('/api/check-changes/albums').get_json()
+            self.assertEqual(after['last_modified'], before['last_modified'] + 5)
+            self.assertEqual(after['subtree_modified'], before['last_modified'] + 5)
+            self.assertEqual(after['stats']['videos'], 2)
+
+            # One two levels down reaches subtree_modified once the index has it
+            Image.new('RGB', (32, 32)).save(os.path.join(trip, 'c.jpg'))
+            os.utime(trip, (before['last_modified'] + 10, before['last_modified'] + 10))
+            index.scan(blocking=True)
+            after = client.get('/api/check-changes/albums').get_json()
+            self.assertEqual(after['subtree_modified'], before['last_modified'] + 10)
+            self.assertEqual(after['stats']['images'], 3)
+
+            # Deletions roll up straight away
+            client.post('/api/batch/delete', json={'paths': ['albums/2024/trip/a.jpg']})
+            self.assertEqual(index.folder_stats(['albums'])['albums']['images'], 2)
+
+        # So do removed folders
+        shutil.rmtree(trip)
+        index.scan(blocking=True)
+        stats = index.folder_stats(['albums', 'albums/2024/trip'])
+        self.assertNotIn('albums/2024/trip', stats)
+        self.assertEqual((stats['albums']['images'], stats['albums']['videos'], stats['albums']['bytes']), (0, 2, 110))
+
 if __name__ == '__main__':
     unittest.main()